@@ -0,0 +1,411 @@
+# api.py
+"""JSON search API: /api/v1/transactions.
+
+    GET /api/v1/transactions?id=2005&fields=date_iso,id,debit&limit=500
+    GET /api/v1/transactions?from=2024-07-01&to=2024-07-31&cursor=<next_cursor>
+    GET /api/v1/transactions?amount=84695&format=ndjson&limit=100000
+    GET /api/v1/transactions?q=funds transfer OR ibft*
+    GET /api/v1/transactions?q=sfer 2005&mode=substring
+    GET /api/v1/transactions?id=200515912578008&edits=1
+    GET /api/v1/query?id=2005&from=2024-07-01&to=2024-07-31&debit_min=10000&explain=true
+    GET /api/v1/transactions/export?q=salary&format=xlsx
+    GET /api/v1/query/export?from=2024-01-01&to=2024-12-31&debit_min=10000&format=csv
+    GET /api/v1/balances?account=0123-4567890&limit=50
+    GET /api/v1/aggregate?by=month&from=2024-01-01&to=2024-12-31
+    GET /api/v1/aggregate?by=counterparty&month=2024-07&sort=debit&limit=10
+
+Results come in row order (date order). A page holds at most ``limit`` rows
+plus an opaque ``next_cursor``, the position of its last row in the dataset
+it was read from. Only the requested page is ever formatted, so paging
+through millions of rows never builds the whole result. The ``/export``
+routes take the same filters and stream every matching row as one file.
+"""
+import base64
+import binascii
+import json
+from typing import Iterator, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+
+import export
+import planner
+import search
+from balances import gap_records, verify_balances
+from cache import ResultCache
+from rollups import TIME_UNITS
+from execution import in_lane, iterate, rows_lane
+from httpcache import snapshot
+from dataset import Dataset, parse_amount, parse_date
+from indexes import query_groups
+
+router = APIRouter(prefix="/api/v1")
+
+TEXT_FIELDS = ["date", "date_iso", "description", "id", "value_date", "debit", "credit", "balance",
+               "source", "account"]
+CENTS_FIELDS = ["debit_cents", "credit_cents", "balance_cents"]
+DEFAULT_FIELDS = ["date", "date_iso", "description", "id", "value_date", "debit", "credit", "balance"]
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000            # per JSON page
+MAX_STREAM_LIMIT = 100_000  # per NDJSON page
+CHUNK_ROWS = 1000           # rows encoded per streamed chunk
+
+# Balance checks of recent dataset generations (one full pass each)
+BALANCE_CHECKS = ResultCache(max_entries=4)
+
+
+# ----------------- CURSOR -----------------
+def encode_cursor(version: str, position: int) -> str:
+    raw = f"{version}:{position}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """(dataset version, last position returned). Raises ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        version, position = raw.rsplit(":", 1)
+        return version, int(position)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("malformed cursor") from None
+
+
+# ----------------- ROWS -----------------
+def _fields(data: Dataset, fields: Optional[str]) -> list[str]:
+    if not fields:
+        return [f for f in DEFAULT_FIELDS if f in data.df]
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    known = [f for f in TEXT_FIELDS + CENTS_FIELDS if f in data.df]
+    unknown = [f for f in wanted if f not in known]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown fields {unknown}; available: {known}")
+    return wanted
+
+
+def _records(data: Dataset, fields: list[str], take: np.ndarray) -> list[dict]:
+    """Rows at ``take`` as dicts, built column by column."""
+    columns = [export.values(data.df, f, take) for f in fields]
+    return [dict(zip(fields, row)) for row in zip(*columns)]
+
+
+def _page(positions: Optional[np.ndarray], total: int, after: int, limit: int) -> tuple[np.ndarray, bool]:
+    """Up to ``limit`` positions past ``after``; ``positions=None`` means all rows."""
+    if positions is None:
+        start = after + 1
+        take = np.arange(start, min(start + limit, total), dtype=np.int64)
+        return take, start + limit < total
+    start = int(np.searchsorted(positions, after, side="right"))
+    return positions[start:start + limit], start + limit < len(positions)
+
+
+def _matches(data: Dataset, date: str, from_date: Optional[str], to_date: Optional[str],
+             amount: str, min_amount: Optional[str], max_amount: Optional[str],
+             tolerance: Optional[str], id: str, edits: int, q: str, prefix: bool,
+             mode: str) -> Optional[np.ndarray]:
+    """Positions matching the one filter given, or None for no filter."""
+    filters = [name for name, given in (
+        ("date", date or from_date or to_date),
+        ("amount", amount or min_amount or max_amount),
+        ("id", id),
+        ("q", q),
+    ) if given]
+    if len(filters) > 1:
+        raise HTTPException(status_code=400,
+                            detail=f"give one of date/amount/id/q filters (or use /api/v1/query), got {filters}")
+    try:
+        if filters == ["date"]:
+            return search.by_date(data, date, from_date, to_date)
+        if filters == ["amount"]:
+            return search.by_amount(data, amount, min_amount, max_amount, tolerance)
+        if filters == ["id"]:
+            return search.by_id(data, id, edits)
+        if filters == ["q"]:
+            return search.by_description(data, q, prefix, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+    return None
+
+
+def _predicates(from_date: Optional[str], to_date: Optional[str], date: str,
+                min_amount: Optional[str], max_amount: Optional[str],
+                debit_min: Optional[str], debit_max: Optional[str],
+                credit_min: Optional[str], credit_max: Optional[str],
+                id: str, q: str, prefix: bool) -> list:
+    """The planner predicates of a /query request."""
+    def cents(text):
+        return abs(parse_amount(text)) if text else None
+
+    preds = []
+    try:
+        if from_date or to_date:
+            preds.append(planner.DateRange(parse_date(from_date) if from_date else None,
+                                           parse_date(to_date) if to_date else None))
+        if date.strip():
+            preds.append(planner.DateText(date.strip()))
+        if min_amount or max_amount:
+            preds.append(planner.AmountRange(cents(min_amount), cents(max_amount)))
+        if debit_min or debit_max:
+            preds.append(planner.AmountRange(cents(debit_min), cents(debit_max), column="debit"))
+        if credit_min or credit_max:
+            preds.append(planner.AmountRange(cents(credit_min), cents(credit_max), column="credit"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+    if id.strip():
+        preds.append(planner.IdPrefix(id.strip()))
+    if query_groups(q, prefix):
+        preds.append(planner.DescriptionMatch(q, prefix))
+    return preds
+
+
+# ----------------- ROUTES -----------------
+@router.get("/transactions")
+@in_lane(lambda mode="words", edits=0, limit=DEFAULT_LIMIT, **_:
+         "slow" if mode == "substring" or edits else rows_lane(limit))
+def transactions(request: Request,
+                 date: str = "",
+                 from_date: Optional[str] = Query(None, alias="from"),
+                 to_date: Optional[str] = Query(None, alias="to"),
+                 amount: str = "",
+                 min_amount: Optional[str] = Query(None, alias="min"),
+                 max_amount: Optional[str] = Query(None, alias="max"),
+                 tolerance: Optional[str] = None,
+                 id: str = "",
+                 edits: int = 0,
+                 q: str = "",
+                 prefix: bool = False,
+                 mode: str = "words",
+                 fields: Optional[str] = None,
+                 limit: int = DEFAULT_LIMIT,
+                 cursor: Optional[str] = None,
+                 format: str = "json"):
+    data = snapshot(request)
+    positions = _matches(data, date, from_date, to_date, amount, min_amount, max_amount, tolerance,
+                         id, edits, q, prefix, mode)
+    return _respond(data, positions, fields, limit, cursor, format)
+
+
+@router.get("/query")
+@in_lane(lambda limit=DEFAULT_LIMIT, **_: rows_lane(limit))
+def query(request: Request,
+          from_date: Optional[str] = Query(None, alias="from"),
+          to_date: Optional[str] = Query(None, alias="to"),
+          date: str = "",
+          min_amount: Optional[str] = Query(None, alias="min"),
+          max_amount: Optional[str] = Query(None, alias="max"),
+          debit_min: Optional[str] = None,
+          debit_max: Optional[str] = None,
+          credit_min: Optional[str] = None,
+          credit_max: Optional[str] = None,
+          id: str = "",
+          q: str = "",
+          prefix: bool = False,
+          fields: Optional[str] = None,
+          limit: int = DEFAULT_LIMIT,
+          cursor: Optional[str] = None,
+          format: str = "json",
+          explain: bool = False):
+    """Every given predicate must hold, e.g.
+    ``?id=2005&from=2024-07-01&to=2024-07-31&debit_min=10000``.
+    Amount bounds are inclusive magnitudes; ``q`` searches descriptions
+    (see search.by_description)."""
+    data = snapshot(request)
+    preds = _predicates(from_date, to_date, date, min_amount, max_amount, debit_min, debit_max,
+                        credit_min, credit_max, id, q, prefix)
+    positions, plan = planner.execute(data, preds)
+    return _respond(data, positions, fields, limit, cursor, format, plan if explain else None)
+
+
+
+@router.get("/transactions/export")
+@in_lane(lambda mode="words", edits=0, **_: "slow" if mode == "substring" or edits else "fast")
+def export_transactions(request: Request,
+                        date: str = "",
+                        from_date: Optional[str] = Query(None, alias="from"),
+                        to_date: Optional[str] = Query(None, alias="to"),
+                        amount: str = "",
+                        min_amount: Optional[str] = Query(None, alias="min"),
+                        max_amount: Optional[str] = Query(None, alias="max"),
+                        tolerance: Optional[str] = None,
+                        id: str = "",
+                        edits: int = 0,
+                        q: str = "",
+                        prefix: bool = False,
+                        mode: str = "words",
+                        fields: Optional[str] = None,
+                        format: str = "csv"):
+    """Every row /transactions would page through, as one CSV, NDJSON or XLSX download."""
+    data = snapshot(request)
+    positions = _matches(data, date, from_date, to_date, amount, min_amount, max_amount, tolerance,
+                         id, edits, q, prefix, mode)
+    return _download(data, positions, fields, format)
+
+
+@router.get("/query/export")
+@in_lane("slow")
+def export_query(request: Request,
+                 from_date: Optional[str] = Query(None, alias="from"),
+                 to_date: Optional[str] = Query(None, alias="to"),
+                 date: str = "",
+                 min_amount: Optional[str] = Query(None, alias="min"),
+                 max_amount: Optional[str] = Query(None, alias="max"),
+                 debit_min: Optional[str] = None,
+                 debit_max: Optional[str] = None,
+                 credit_min: Optional[str] = None,
+                 credit_max: Optional[str] = None,
+                 id: str = "",
+                 q: str = "",
+                 prefix: bool = False,
+                 fields: Optional[str] = None,
+                 format: str = "csv"):
+    """Every row /query would page through, as one CSV, NDJSON or XLSX download."""
+    data = snapshot(request)
+    preds = _predicates(from_date, to_date, date, min_amount, max_amount, debit_min, debit_max,
+                        credit_min, credit_max, id, q, prefix)
+    positions, _ = planner.execute(data, preds)
+    return _download(data, positions, fields, format)
+
+@router.get("/balances")
+@in_lane("slow")
+def balances(request: Request, account: Optional[str] = None, limit: int = DEFAULT_LIMIT):
+    """Rows where an account's running balance doesn't follow from the
+    previous balance, debit and credit (see balances.py), earliest first."""
+    if not 0 <= limit <= MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 0 and {MAX_LIMIT}")
+    data = snapshot(request)
+    result = BALANCE_CHECKS.get("balances", data.generation)
+    if result is None:
+        result = verify_balances(data.df)
+        size = result["breaks"].nbytes + result["expected"].nbytes
+        BALANCE_CHECKS.put("balances", data.generation, result, size)
+    if account is None:
+        counts = {"rows": result["rows"], "checked": result["checked"], "breaks": len(result["breaks"])}
+    elif account in result["accounts"]:
+        counts = result["accounts"][account]
+    else:
+        raise HTTPException(status_code=404, detail=f"no account {account!r}")
+    body = {**counts, "accounts": result["accounts"], "gaps": gap_records(data.df, result, limit, account),
+            "version": data.version}
+    return Response(json.dumps(body, separators=(",", ":")), media_type="application/json")
+
+
+def _month(text: Optional[str]) -> Optional[np.datetime64]:
+    if not text:
+        return None
+    try:
+        return np.datetime64(text.strip(), "M")
+    except ValueError:
+        raise ValueError(f"not a month (YYYY-MM): {text!r}") from None
+
+
+AGGREGATE_SORTS = {"key": "key", "rows": "rows", "debit": "debit_cents", "credit": "credit_cents",
+                   "net": "net_cents", "total": "total_cents"}
+
+
+@router.get("/aggregate")
+@in_lane("fast")
+def aggregate(request: Request,
+              by: str = "month",
+              account: Optional[str] = None,
+              from_date: Optional[str] = Query(None, alias="from"),
+              to_date: Optional[str] = Query(None, alias="to"),
+              month: Optional[str] = None,
+              id_len: int = 4,
+              sort: Optional[str] = None,
+              limit: int = DEFAULT_LIMIT):
+    """Row counts and debit/credit totals (int cents) grouped ``by`` day,
+    week, month, ``id`` (the first ``id_len`` characters) or counterparty,
+    read from the dataset's rollups (see rollups.py). Time groupings take
+    from/to days, counterparties one ``month`` (YYYY-MM); ID prefixes are
+    always over all time and accounts."""
+    data = snapshot(request)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_LIMIT}")
+    sort = sort or ("key" if by in TIME_UNITS else "total")
+    if sort not in AGGREGATE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {list(AGGREGATE_SORTS)}")
+    try:
+        if by in TIME_UNITS:
+            if month:
+                raise ValueError("month only applies to by=id or by=counterparty; use from/to")
+            groups = data.rollups.by_time(by, account, parse_date(from_date) if from_date else None,
+                                          parse_date(to_date) if to_date else None)
+        elif by in ("id", "counterparty"):
+            if from_date or to_date:
+                raise ValueError(f"by={by} has no day totals; use month=YYYY-MM with by=counterparty")
+            if by == "id":
+                if month or account:
+                    raise ValueError("by=id is totalled over all time and accounts")
+                groups = data.rollups.by_id(data.df, data.ids, id_len)
+            else:
+                groups = data.rollups.by_counterparty(account, _month(month))
+        else:
+            raise ValueError(f"by must be one of {list(TIME_UNITS) + ['id', 'counterparty']}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+
+    groups = groups.assign(net_cents=groups["credit_cents"] - groups["debit_cents"],
+                           total_cents=groups["credit_cents"] + groups["debit_cents"])
+    groups = groups.rename_axis("key").reset_index()
+    groups = groups.sort_values(AGGREGATE_SORTS[sort], ascending=sort == "key", kind="stable")
+    body = {"by": by, "count": len(groups), "groups": groups.head(limit).to_dict("records"),
+            "version": data.version}
+    return Response(json.dumps(body, separators=(",", ":"), default=int), media_type="application/json")
+
+
+def _respond(data: Dataset, positions: Optional[np.ndarray], fields: Optional[str], limit: int,
+             cursor: Optional[str], format: str, plan: Optional[list] = None) -> Response:
+    """One page of ``positions`` (None = every row) as JSON or NDJSON."""
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+    max_limit = MAX_STREAM_LIMIT if format == "ndjson" else MAX_LIMIT
+    if not 1 <= limit <= max_limit:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {max_limit}")
+
+    after = -1
+    if cursor:
+        try:
+            version, after = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from None
+        if version != data.version:
+            raise HTTPException(status_code=410, detail="dataset reloaded since this cursor; start again")
+
+    columns = _fields(data, fields)
+    count = len(data) if positions is None else len(positions)
+    take, more = _page(positions, len(data), after, limit)
+    next_cursor = encode_cursor(data.version, int(take[-1])) if more and len(take) else None
+
+    if format == "json":
+        body = {"count": count, "rows": _records(data, columns, take), "next_cursor": next_cursor,
+                "version": data.version}
+        if plan is not None:
+            body["plan"] = plan
+        return Response(json.dumps(body, separators=(",", ":")), media_type="application/json")
+
+    def lines() -> Iterator[str]:
+        for start in range(0, len(take), CHUNK_ROWS):
+            records = _records(data, columns, take[start:start + CHUNK_ROWS])
+            yield "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+
+    headers = {"X-Total-Count": str(count)}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if plan is not None:
+        headers["X-Query-Plan"] = json.dumps(plan, separators=(",", ":"), ensure_ascii=True)
+    return StreamingResponse(iterate(lines(), rows_lane(len(take))), media_type="application/x-ndjson",
+                             headers=headers)
+
+
+def _download(data: Dataset, positions: Optional[np.ndarray], fields: Optional[str],
+              format: str) -> StreamingResponse:
+    """All of ``positions`` (None = every row) as a file, streamed in chunks."""
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(export.FORMATS)}")
+    columns = _fields(data, fields)
+    count = len(data) if positions is None else len(positions)
+    headers = {"X-Total-Count": str(count),
+               "Content-Disposition": f'attachment; filename="transactions.{format}"'}
+    return StreamingResponse(iterate(export.chunks(format, data.df, columns, positions), rows_lane(count)),
+                             media_type=export.FORMATS[format], headers=headers)
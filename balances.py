@@ -0,0 +1,179 @@
+# balances.py
+"""Running-balance verification.
+
+Within one account, in statement order, every printed balance should be the
+previous printed balance minus the debits plus the credits in between. A row
+where that chain breaks was almost always mis-split by the parser (an amount
+taken from the description, a missing column, debit and credit swapped).
+
+Everything is int64 cents and whole-column NumPy operations, so checking
+millions of rows takes well under a second:
+
+    python balances.py                      # report on transactions.cols/
+    python balances.py --account 0123456789 --limit 50
+
+The exit status is 1 when the chain breaks anywhere, so it can gate a
+pipeline; the parser also prints a summary after every ingest.
+"""
+import argparse
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from colstore import STORE_DIR, read_meta, read_store
+from dataset import NO_AMOUNT, add_typed_columns, sort_by_date
+
+REPORT_COLUMNS = ["date", "account", "id", "description", "debit", "credit", "balance", "source"]
+
+
+def format_cents(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    whole, frac = divmod(abs(int(cents)), 100)
+    return f"{sign}{whole:,}.{frac:02d}"
+
+
+def _magnitude(cents: np.ndarray) -> np.ndarray:
+    # Debits may be printed negative; a blank amount moves nothing
+    return np.where(cents == NO_AMOUNT, 0, np.abs(cents))
+
+
+def _statement_order(df: pd.DataFrame, account: np.ndarray) -> np.ndarray:
+    """Positions of ``df`` account by account, each account's statements by
+    their first date and every statement's rows in the order printed."""
+    sources, names = pd.factorize(df["source"], use_na_sentinel=False)
+    days = df["date_dt"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    days = np.where(days == np.iinfo(np.int64).min, np.iinfo(np.int64).max, days)  # NaT sorts last
+    first = np.full(len(names), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, sources, days)
+    return np.lexsort((df["record"].to_numpy(), sources, first[sources], account))
+
+
+def verify_balances(df: pd.DataFrame) -> dict:
+    """Check the balance chain of every account in ``df``, in statement
+    order (rows stored without record numbers are taken in date order, as
+    a Dataset holds them).
+
+    Returns the row and check counts, the sorted positions of the rows whose
+    balance doesn't follow from the previous one (``breaks``), the balance
+    each of them should have had (``expected``), and per-account counts.
+    The first balance of an account, and rows printed without a balance or
+    date, can't be checked; movements on the former are carried to the next.
+    """
+    n = len(df)
+    if "account" in df:
+        codes, names = pd.factorize(df["account"], use_na_sentinel=False)
+    else:  # legacy CSV: one account
+        codes, names = np.zeros(n, dtype=np.int64), np.array([""], dtype=object)
+    # Account by account. Statements aren't always printed in date order,
+    # so rows are taken in the order they were printed where that's known.
+    sequenced = "source" in df and "record" in df
+    if sequenced:
+        order = _statement_order(df, codes)
+    else:  # date order within (small codes get a radix sort)
+        order = np.argsort(codes.astype(np.uint16) if len(names) <= 2**16 else codes, kind="stable")
+    account = codes[order]
+
+    balance = df["balance_cents"].to_numpy()[order]
+    moved = np.cumsum(_magnitude(df["credit_cents"].to_numpy()[order]) -
+                      _magnitude(df["debit_cents"].to_numpy()[order]))
+
+    # For each row, the nearest earlier row that printed a balance. In date
+    # order undated rows are sorted last, out of place, so they're left out.
+    has = balance != NO_AMOUNT
+    if "date_dt" in df and not sequenced:
+        has &= df["date_dt"].notna().to_numpy()[order]
+    last = np.maximum.accumulate(np.where(has, np.arange(n), -1)) if n else np.empty(0, dtype=np.int64)
+    prev = np.concatenate([[-1], last[:-1]]).astype(np.int64) if n else last
+    p = prev.clip(min=0)
+
+    checked = has & (prev >= 0) & (account[p] == account)
+    expected = balance[p] + (moved - moved[p])
+    broken = checked & (expected != balance)
+
+    # Back to row order by scattering, not sorting
+    at = np.zeros(n, dtype=bool)
+    at[order[broken]] = True
+    positions = np.flatnonzero(at)
+    should = np.empty(n, dtype=np.int64)
+    should[order] = expected
+    accounts = {
+        str(name): {"rows": int(rows), "checked": int(ok), "breaks": int(bad)}
+        for name, rows, ok, bad in zip(names, np.bincount(account, minlength=len(names)),
+                                       np.bincount(account[checked], minlength=len(names)),
+                                       np.bincount(account[broken], minlength=len(names)))
+    }
+    return {
+        "rows": n,
+        "checked": int(checked.sum()),
+        "breaks": positions.astype(np.int64),
+        "expected": should[positions],
+        "accounts": accounts,
+    }
+
+
+def gap_records(df: pd.DataFrame, result: dict, limit: int, account: Optional[str] = None) -> list[dict]:
+    """The first ``limit`` breaks as dicts: the row's own fields plus the
+    balance it should have had and the difference."""
+    breaks, expected = result["breaks"], result["expected"]
+    if account is not None and "account" in df:
+        keep = df["account"].array[breaks].to_numpy() == account
+        breaks, expected = breaks[keep], expected[keep]
+    breaks, expected = breaks[:limit], expected[:limit]
+
+    columns = [c for c in REPORT_COLUMNS if c in df]
+    records = df.iloc[breaks][columns].to_dict("records")
+    actual = df["balance_cents"].to_numpy()[breaks]
+    for position, record, want, got in zip(breaks.tolist(), records, expected.tolist(), actual.tolist()):
+        record["position"] = position
+        record["expected_balance"] = format_cents(want)
+        record["difference"] = format_cents(got - want)
+    return records
+
+
+def read_for_check(store_dir: str) -> pd.DataFrame:
+    """The columns a check needs from a store, in Dataset (date) order."""
+    present = read_meta(store_dir)["columns"]
+    wanted = ["date", "account", "source", "record", "date_dt", "debit_cents", "credit_cents", "balance_cents"]
+    # Stores without the typed columns need the text they're derived from
+    derived = {"date_iso": "date_dt", "debit": "debit_cents", "credit": "credit_cents", "balance": "balance_cents"}
+    wanted += [text for text, typed in derived.items() if typed not in present]
+    df = read_store(store_dir, columns=[c for c in wanted if c in present])
+    return sort_by_date(add_typed_columns(df))
+
+
+def summary(result: dict) -> str:
+    breaks = len(result["breaks"])
+    accounts = len(result["accounts"])
+    if not breaks:
+        return f"✅ Balances chain across {result['rows']} rows in {accounts} account(s) " \
+               f"({result['checked']} checked)"
+    bad = sum(1 for a in result["accounts"].values() if a["breaks"])
+    return f"⚠️ {breaks} balance breaks in {bad} of {accounts} account(s) " \
+           f"({result['checked']} rows checked); run `python balances.py` for the list"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify the running balance of every account in the store")
+    parser.add_argument("store", nargs="?", default=STORE_DIR, help=f"columnar store (default: {STORE_DIR})")
+    parser.add_argument("--account", default=None, help="only list breaks in this account")
+    parser.add_argument("--limit", type=int, default=20, help="breaks to list (default: 20)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    df = read_for_check(args.store)
+    result = verify_balances(df)
+    print(f"{summary(result)} in {time.perf_counter() - t0:.2f}s")
+    for name, counts in result["accounts"].items():
+        if counts["breaks"] and args.account in (None, name):
+            print(f"  {name or '(no account)'}: {counts['breaks']} breaks / {counts['checked']} checked")
+
+    if len(result["breaks"]) and args.limit > 0:
+        full = sort_by_date(add_typed_columns(read_store(args.store)))  # every column, for the rows listed
+        for r in gap_records(full, result, args.limit, args.account):
+            print(f"  #{r['position']} {r['date']} {r.get('id', '')}: balance {r['balance']}, "
+                  f"expected {r['expected_balance']} (off by {r['difference']}) "
+                  f"debit {r['debit'] or '-'} credit {r['credit'] or '-'}")
+    sys.exit(1 if len(result["breaks"]) else 0)
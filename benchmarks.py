@@ -0,0 +1,338 @@
+# benchmarks.py
+"""Micro-benchmarks for the search paths on synthetic data.
+
+    python benchmarks.py ids --rows 10000 1000000 10000000
+    python benchmarks.py store --rows 100000 1000000
+    python benchmarks.py substr --rows 1000000 5000000
+    python benchmarks.py lines --rows 100000 1000000
+    python benchmarks.py parse --rows 100000 1000000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from balances import format_cents
+from colstore import write_store
+from dataset import Dataset, add_typed_columns
+from indexes import IdIndex
+from pdf_parser import CONTINUATION, DATE_RX, START, _parse_record, _rows_from_texts, classify_line
+from search import by_description_text
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+# ----------------- SYNTHETIC DATA -----------------
+def synthetic_ids(n: int, seed: int = 0) -> pd.Series:
+    """``n`` 15-digit transaction IDs shaped like 200515912587008."""
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(10**14, 10**15, size=n, dtype=np.int64)
+    return pd.Series(ids.astype(str), dtype=object)
+
+
+COUNTERPARTIES = [
+    "IBFT TRANSFER", "CHEQUE PAID", "POS PURCHASE", "SALARY CREDIT", "FUNDS TRANSFER",
+    "ATM WITHDRAWAL", "UTILITY BILL", "INTER BRANCH", "CASH DEPOSIT", "ONLINE PAYMENT",
+]
+
+
+def _amount_text(cents: np.ndarray) -> pd.Series:
+    # Split the magnitude: // and % round negative cents down (-530 -> -6, 70)
+    whole, frac = np.divmod(np.abs(cents), 100)
+    sign = pd.Series(np.where(cents < 0, "-", ""))
+    return sign + pd.Series(whole).astype(str) + "." + pd.Series(frac).astype(str).str.zfill(2)
+
+
+def synthetic_transactions(n: int, seed: int = 0) -> pd.DataFrame:
+    """``n`` parser-shaped rows (all text columns), in date order."""
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, 5 * 365, size=n)).astype("timedelta64[D]")
+    dates = pd.Series(np.datetime64("2020-01-01") + days)
+    date_txt = dates.dt.strftime("%d %b %y").str.upper()
+
+    is_debit = rng.random(n) < 0.6
+    amount = rng.integers(100, 10_000_000, size=n)
+    debit = np.where(is_debit, amount, 0)
+    credit = np.where(is_debit, 0, amount)
+    balance = 10**9 + np.cumsum(credit - debit)
+
+    ids = synthetic_ids(n, seed)
+    desc = pd.Series(np.array(COUNTERPARTIES, dtype=object)[rng.integers(0, len(COUNTERPARTIES), size=n)])
+    df = pd.DataFrame({
+        "date": date_txt,
+        "date_iso": dates.dt.strftime("%Y-%m-%d"),
+        "description": desc + " " + ids,
+        "id": ids,
+        "value_date": date_txt,
+        "debit": _amount_text(debit),
+        "credit": _amount_text(credit),
+        "balance": _amount_text(balance),
+    })
+    df["raw"] = df["date"] + " " + df["description"] + " " + df["debit"] + " " + df["credit"] + " " + df["balance"]
+    return df
+
+
+def _timeit(fn, repeat: int) -> float:
+    """Best-of-``repeat`` wall time of ``fn()`` in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _fmt(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:9.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:9.1f} ms"
+    return f"{seconds:9.2f} s "
+
+
+# ----------------- ID LOOKUPS -----------------
+def bench_ids(rows: list[int], queries: int) -> None:
+    print(f"{'rows':>10} | {'build':>12} | {'scan exact':>12} | {'index exact':>12} | "
+          f"{'scan prefix':>12} | {'index prefix':>12}")
+    for n in rows:
+        ids = synthetic_ids(n)
+        rng = np.random.default_rng(1)
+        sample = ids.iloc[rng.integers(0, n, size=queries)].tolist()
+        prefixes = [s[:6] for s in sample]
+
+        t0 = time.perf_counter()
+        index = IdIndex(ids)
+        build = time.perf_counter() - t0
+
+        # The scan is slow at scale, so time fewer repetitions of it
+        repeat = 1 if n >= 1_000_000 else 3
+        scan_exact = _timeit(lambda: [ids[ids.str.contains(q, na=False)] for q in sample], repeat)
+        idx_exact = _timeit(lambda: [ids.iloc[index.search(q)] for q in sample], 5)
+        scan_prefix = _timeit(lambda: [ids[ids.str.contains(p, na=False)] for p in prefixes], repeat)
+        idx_prefix = _timeit(lambda: [ids.iloc[index.search(p)] for p in prefixes], 5)
+
+        print(f"{n:>10} | {_fmt(build):>12} | {_fmt(scan_exact / queries):>12} | "
+              f"{_fmt(idx_exact / queries):>12} | {_fmt(scan_prefix / queries):>12} | "
+              f"{_fmt(idx_prefix / queries):>12}")
+
+
+# ----------------- SUBSTRING / FUZZY -----------------
+def bench_substr(rows: list[int], queries: int) -> None:
+    print(f"{'rows':>10} | {'query':>16} | {'build':>12} | {'scan':>12} | {'trigram':>12} | {'hits':>8}")
+    for n in rows:
+        data = Dataset(synthetic_transactions(n).drop(columns=["raw"]))
+        ids, desc, id_index = data.df["id"], data.df["description"], data.ids
+        rng = np.random.default_rng(1)
+        picks = rng.integers(0, n, size=queries)
+
+        t0 = time.perf_counter()
+        id_index.warm()
+        id_build = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        data.text.warm()
+        text_build = time.perf_counter() - t0
+
+        # Typos: one digit of a real ID replaced
+        typos = []
+        for p in picks:
+            s = ids.iloc[p]
+            i = int(rng.integers(0, len(s)))
+            typos.append(s[:i] + str((int(s[i]) + 1) % 10) + s[i + 1:])
+
+        cases = [
+            ("id infix (6)", [ids.iloc[p][4:10] for p in picks], id_build,
+             lambda q: ids.str.contains(q, regex=False), id_index.contains),
+            ("desc infix", [desc.iloc[p][6:16] for p in picks], text_build,
+             lambda q: desc.str.contains(q, case=False, regex=False),
+             lambda q: by_description_text(data, q)),
+            ("id 1 typo", typos, 0.0,
+             lambda q: ids.str.contains(q, regex=False),  # what the app did: finds nothing
+             lambda q: id_index.similar(q, 1)),
+        ]
+        repeat = 1 if n >= 1_000_000 else 3
+        for name, qs, build, scan, indexed in cases:
+            scan_t = _timeit(lambda: [scan(q) for q in qs], repeat)
+            idx_t = _timeit(lambda: [indexed(q) for q in qs], 3)
+            hits = sum(len(indexed(q)) for q in qs) / len(qs)
+            print(f"{n:>10} | {name:>16} | {_fmt(build):>12} | {_fmt(scan_t / len(qs)):>12} | "
+                  f"{_fmt(idx_t / len(qs)):>12} | {hits:8.1f}")
+
+
+# ----------------- DATASET LOAD -----------------
+_LOAD_SNIPPET = """
+import sys, time
+import numpy as np, pandas as pd
+import colstore, dataset
+
+def mem():
+    # (RSS, anonymous) in KiB; anonymous memory is what each extra worker
+    # pays again, file-backed (memory-mapped) pages are shared between them
+    fields = dict(line.split(":", 1) for line in open("/proc/self/smaps_rollup") if ":" in line)
+    return int(fields["Rss"].split()[0]), int(fields["Anonymous"].split()[0])
+
+rss0, anon0 = mem()
+t0 = time.perf_counter()
+if sys.argv[1] == "csv":
+    df = pd.read_csv(sys.argv[2], dtype=str).fillna("")
+else:
+    columns = [c for c in colstore.read_meta(sys.argv[2])["columns"] if c not in dataset.UNSERVED_COLUMNS]
+    df = colstore.read_store(sys.argv[2], columns=columns)
+elapsed = time.perf_counter() - t0
+for col in df.columns:  # fault every column in, as serving would
+    values = df[col].array
+    values[len(values) - 1:].to_numpy()  # not the whole column: that decodes every string
+    if isinstance(values, pd.Categorical):
+        np.asarray(values.codes).sum()
+    elif df[col].dtype.kind in "iM":
+        df[col].to_numpy().view(np.int64).sum()
+rss, anon = mem()
+print(elapsed, (rss - rss0) / 1024, (anon - anon0) / 1024)
+"""
+
+
+def _measure_load(fmt: str, path: str) -> tuple[float, float, float]:
+    """Load time (s), RSS growth and unshared growth (MiB) in a fresh interpreter."""
+    out = subprocess.run([sys.executable, "-c", _LOAD_SNIPPET, fmt, path], check=True,
+                         capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed, rss, anon = out.stdout.split()
+    return float(elapsed), float(rss), float(anon)
+
+
+def bench_store(rows: list[int]) -> None:
+    print(f"{'rows':>10} | {'format':>6} | {'load':>10} | {'RSS':>10} | {'unshared':>10} | {'on disk':>10}")
+    for n in rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            df = synthetic_transactions(n)
+            csv_file, store_dir = os.path.join(tmp, "t.csv"), os.path.join(tmp, "t.cols")
+            df.to_csv(csv_file, index=False)
+            write_store(store_dir, add_typed_columns(df))
+            del df
+
+            sizes = {
+                "csv": os.path.getsize(csv_file),
+                "cols": sum(os.path.getsize(os.path.join(store_dir, f)) for f in os.listdir(store_dir)),
+            }
+            for fmt, path in (("csv", csv_file), ("cols", store_dir)):
+                elapsed, rss, anon = _measure_load(fmt, path)
+                print(f"{n:>10} | {fmt:>6} | {_fmt(elapsed):>10} | {rss:6.0f} MiB | {anon:6.0f} MiB | "
+                      f"{sizes[fmt] / 2**20:6.0f} MiB")
+
+
+# ----------------- LINE CLASSIFIER -----------------
+_OLD_HEADER_WORDS = ["DATE", "DESCRIPTION", "VALUE DATE", "DEBIT", "CREDIT", "BALANCE",
+                     "ACCOUNT", "STATEMENT", "PAGE", "OPENING BALANCE", "CLOSING BALANCE"]
+
+
+def _keyword_scan(line: str):
+    """How the parser tagged lines before classify_line: any keyword anywhere
+    made it a header, even inside a narration ('SALARY CREDIT ...')."""
+    if any(h in line.upper() for h in _OLD_HEADER_WORDS):
+        return "header", None
+    m = DATE_RX.match(line)
+    return (START, m.group(1)) if m else (CONTINUATION, None)
+
+
+def line_fixtures() -> list[tuple[str, str]]:
+    """(kind, line) pairs from fixtures/statement_lines.tsv."""
+    with open(os.path.join(FIXTURES_DIR, "statement_lines.tsv"), encoding="utf-8") as f:
+        return [tuple(row.rstrip("\n").split("\t", 1)) for row in f if row.strip() and not row.startswith("#")]
+
+
+def bench_lines(rows: list[int]) -> None:
+    fixtures = line_fixtures()
+    wrong = [(kind, line, classify_line(line)[0]) for kind, line in fixtures if classify_line(line)[0] != kind]
+    for kind, line, got in wrong:
+        print(f"❌ {line!r}: expected {kind}, got {got}")
+    old_wrong = sum(_keyword_scan(line)[0] != kind for kind, line in fixtures)
+    print(f"fixtures: {len(fixtures) - len(wrong)}/{len(fixtures)} classified right "
+          f"(keyword scan: {len(fixtures) - old_wrong}/{len(fixtures)})")
+
+    print(f"{'lines':>10} | {'keyword scan':>12} | {'classifier':>12} | {'speedup':>8}")
+    for n in rows:
+        # Transactions, each with a narration line, and a page of furniture every 50
+        raw = synthetic_transactions(n // 2)["raw"].tolist()
+        furniture = [line for kind, line in fixtures if kind in ("header", "footer")]
+        lines = []
+        for i, line in enumerate(raw):
+            lines += [line, f"REF NARRATION {i}"]
+            if i % 50 == 0:
+                lines += furniture[:4]
+        old = _timeit(lambda: [_keyword_scan(line) for line in lines], 3)
+        new = _timeit(lambda: [classify_line(line) for line in lines], 3)
+        print(f"{len(lines):>10} | {_fmt(old):>12} | {_fmt(new):>12} | {old / new:7.1f}x")
+    if wrong:
+        sys.exit(1)
+
+
+# ----------------- RECORD PARSING -----------------
+STATEMENT_HEAD = "ACCOUNT STATEMENT ACCOUNT NO: 0123-4567890\nDATE DESCRIPTION VALUE DATE DEBIT CREDIT BALANCE"
+
+
+def synthetic_statement(n: int, per_page: int = 30, seed: int = 0) -> list[str]:
+    """Page texts of a statement with ``n`` transactions, laid out like the
+    sample PDF: comma-grouped amounts, a value date and a narration line per
+    transaction, headings at the top of each page and its number at the end."""
+    df = synthetic_transactions(n, seed)
+    debit, credit, balance = ([format_cents(int(v.replace(".", ""))) for v in df[c]]
+                              for c in ("debit", "credit", "balance"))
+    lines = [f"{d} {desc} {d} {dr} {cr} {bal}\nREF NARRATION {i}"
+             for i, (d, desc, dr, cr, bal) in enumerate(zip(df["date"], df["description"], debit, credit, balance))]
+    return [f"{STATEMENT_HEAD}\n" + "\n".join(lines[p:p + per_page]) + f"\nPAGE {p // per_page + 1}"
+            for p in range(0, n, per_page)]
+
+
+def bench_parse(rows: list[int]) -> None:
+    print(f"{'records':>10} | {'pages':>7} | {'parse':>12} | {'records/s':>10} | {'_parse_record':>13} | {'records/s':>10}")
+    for n in rows:
+        texts = synthetic_statement(n)
+        t0 = time.perf_counter()
+        records = _rows_from_texts(texts)
+        whole = time.perf_counter() - t0
+        assert len(records) == n, f"parsed {len(records)} of {n} records"
+
+        blocks = [{"date_txt": r["date"], "raw": r["raw"]} for r in records]
+        t0 = time.perf_counter()
+        for block in blocks:
+            _parse_record(block)
+        split = time.perf_counter() - t0
+        print(f"{n:>10} | {len(texts):>7} | {_fmt(whole):>12} | {n / whole:10.0f} | {_fmt(split):>13} | {n / split:10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p_ids = sub.add_parser("ids", help="str.contains scan vs IdIndex (per query)")
+    p_ids.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    p_ids.add_argument("--queries", type=int, default=5)
+
+    p_store = sub.add_parser("store", help="transactions.csv vs columnar store: load time and RSS")
+    p_store.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+
+    p_substr = sub.add_parser("substr", help="str.contains vs trigram substring and typo matching")
+    p_substr.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    p_substr.add_argument("--queries", type=int, default=5)
+
+    p_lines = sub.add_parser("lines", help="keyword scan vs classify_line; checks fixtures/statement_lines.tsv")
+    p_lines.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+
+    p_parse = sub.add_parser("parse", help="record parsing throughput on a synthetic statement")
+    p_parse.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+
+    args = parser.parse_args()
+    if args.bench == "ids":
+        bench_ids(args.rows, args.queries)
+    elif args.bench == "store":
+        bench_store(args.rows)
+    elif args.bench == "substr":
+        bench_substr(args.rows, args.queries)
+    elif args.bench == "lines":
+        bench_lines(args.rows)
+    elif args.bench == "parse":
+        bench_parse(args.rows)
@@ -0,0 +1,93 @@
+# cache.py
+"""Bounded LRU + TTL caches for search results.
+
+Entries belong to one dataset generation. The first lookup made with a newer
+generation (a reload or an append was swapped in) drops every entry, and
+lookups still holding an older snapshot bypass the cache entirely.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+CACHE_ENTRIES = int(os.environ.get("RESULT_CACHE_ENTRIES", "1024"))
+CACHE_MB = float(os.environ.get("RESULT_CACHE_MB", "64"))
+CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "300"))  # seconds
+
+
+def query_key(*parts) -> tuple:
+    """Normalise query parts the way every search does (surrounding spaces
+    don't matter, a blank is no filter) so equivalent queries share an entry."""
+    return tuple((p.strip() or None) if isinstance(p, str) else p for p in parts)
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = CACHE_ENTRIES, max_bytes: int = int(CACHE_MB * 2**20),
+                 ttl: float = CACHE_TTL):
+        self.max_entries, self.max_bytes, self.ttl = max_entries, max_bytes, ttl
+        self.generation = -1
+        self._entries: OrderedDict = OrderedDict()  # key -> (value, size, expires)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _current(self, generation: int) -> bool:
+        """Adopt a newer generation (dropping everything); False if older."""
+        if generation > self.generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.generation = generation
+        return generation == self.generation
+
+    def _drop(self, key) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key, generation: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key) if self._current(generation) else None
+            if entry is not None and entry[2] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, generation: int, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if not self._current(generation):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,333 @@
+# colstore.py
+"""Columnar on-disk dataset: one file per column, memory-mappable.
+
+    transactions.cols/
+      meta.json            row count, column kinds/dtypes, free-form attrs
+      <col>.bin            fixed-width column (int cents, datetime64, ...)
+      <col>.codes          int32 codes of a dictionary-encoded string column
+      <col>.dict           its dictionary, utf-8 strings joined by NUL
+      <col>.off            int64 byte offsets (rows + 1) of a plain string column
+      <col>.txt            its utf-8 strings, end to end
+
+Columns are memory-mapped, not decoded: numeric ones are ``np.memmap``
+arrays, dictionary-encoded ones Categoricals over the mapped codes, and
+plain strings Arrow string arrays over the mapped offsets and bytes. So
+several processes reading the same store share page-cache pages instead of
+each holding a copy. (Without pyarrow, plain strings are decoded into every
+process; so are the NUL-joined ``<col>.str`` columns of older stores.)
+Every file is append-only and ``meta.json`` (replaced atomically, written
+last) says how many rows are valid, so a reader never sees a half-written
+append. Replacing rows (``replace_tail``) writes new files instead, so a
+reader still mapping the old ones keeps its rows.
+
+``meta.json`` records the store format. Format 2 added the ``text`` kind
+(``.off``/``.txt``) for plain string columns, which format 1 stored as
+NUL-joined ``.str`` files. Format 1 stores are still read and appended to,
+and become format 2 when rewritten. Code older than format 2 can't read
+``text`` columns, and this code refuses stores newer than FORMAT_VERSION.
+"""
+import json
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:  # optional: without it plain string columns are decoded into every process
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+STORE_DIR = "transactions.cols"
+FORMAT_VERSION = 2  # see above; stores without a "format" are format 1
+META_FILE = "meta.json"
+SEP = "\x00"
+COPY_CHUNK = 16 << 20  # bytes copied at a time by replace_tail
+
+# Files backing each column kind
+FILES = {"array": (".bin",), "dict": (".codes", ".dict"), "text": (".off", ".txt"),
+         "str": (".str",)}  # "str": NUL-joined, written by older code
+
+# String columns with at most this many distinct values per row are
+# dictionary-encoded; the rest are stored as plain text. A dictionary is
+# decoded by every process reading it, so it has to stay small.
+DICT_RATIO = 0.05
+
+
+def _arrow_strings() -> Optional[pd.StringDtype]:
+    """Arrow-backed strings with NaN for missing values (like the rest of the
+    frame), or None without a pyarrow this pandas can use."""
+    if pa is None:
+        return None
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)  # pandas >= 2.3
+    except TypeError:
+        pass
+    try:
+        return pd.StringDtype("pyarrow_numpy")  # pandas 2.1 and 2.2
+    except (ImportError, ValueError):
+        return None
+
+
+ARROW_STRINGS = _arrow_strings()
+
+
+def _meta_path(path: str) -> str:
+    return os.path.join(path, META_FILE)
+
+
+def read_meta(path: str) -> dict:
+    with open(_meta_path(path), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format", 1) > FORMAT_VERSION:
+        raise ValueError(f"{path} is in store format {meta['format']}; "
+                         f"this code reads up to {FORMAT_VERSION}")
+    return meta
+
+
+def _write_meta(path: str, meta: dict) -> None:
+    tmp = _meta_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, _meta_path(path))
+
+
+def store_exists(path: str) -> bool:
+    return os.path.exists(_meta_path(path))
+
+
+def store_rows(path: str) -> int:
+    return read_meta(path)["rows"] if store_exists(path) else 0
+
+
+def store_attrs(path: str) -> dict:
+    return read_meta(path).get("attrs", {}) if store_exists(path) else {}
+
+
+def drop_store(path: str) -> None:
+    """Invalidate a store; the column files are overwritten by the next write."""
+    if store_exists(path):
+        os.remove(_meta_path(path))
+
+
+# ----------------- ENCODING -----------------
+def _is_string(series: pd.Series) -> bool:
+    return (series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+            or isinstance(series.dtype, pd.CategoricalDtype))
+
+
+def _strings(values: pd.Series) -> np.ndarray:
+    return values.astype(object).fillna("").astype(str).to_numpy(dtype=object)
+
+
+def _join(values) -> bytes:
+    return SEP.join(values).encode("utf-8")
+
+
+def _split(blob: bytes, count: int) -> np.ndarray:
+    if count == 0:
+        return np.empty(0, dtype=object)
+    return np.array(blob.decode("utf-8").split(SEP), dtype=object)
+
+
+def _append_bytes(file: str, data: bytes, first: bool) -> int:
+    # NUL goes *between* values, so only prefix one when appending
+    data = data if first else SEP.encode() + data
+    with open(file, "ab") as f:
+        f.write(data)
+    return len(data)
+
+
+def _read_bytes(file: str, size: int) -> bytes:
+    with open(file, "rb") as f:
+        return f.read(size)
+
+
+def _dictionary(path: str, col: str, spec: dict) -> np.ndarray:
+    return _split(_read_bytes(os.path.join(path, col + ".dict"), spec["dict_bytes"]), spec["dict_size"])
+
+
+def _valid_sizes(col: str, spec: dict, rows: int) -> dict:
+    """Byte length of each of the column's files according to meta.json."""
+    if spec["kind"] == "array":
+        return {col + ".bin": rows * np.dtype(spec["dtype"]).itemsize}
+    if spec["kind"] == "dict":
+        return {col + ".codes": rows * 4, col + ".dict": spec["dict_bytes"]}
+    if spec["kind"] == "text":
+        return {col + ".off": (rows + 1) * 8, col + ".txt": spec["bytes"]}
+    return {col + ".str": spec["bytes"]}
+
+
+def _encode(path: str, col: str, values: pd.Series, spec: dict, rows_before: int) -> None:
+    """Append ``values`` to column ``col`` and update its ``spec`` in place."""
+    kind = spec["kind"]
+    if kind == "array":
+        arr = np.ascontiguousarray(values.to_numpy(dtype=np.dtype(spec["dtype"])))
+        with open(os.path.join(path, col + ".bin"), "ab") as f:
+            f.write(arr.tobytes())
+    elif kind == "dict":
+        known = _dictionary(path, col, spec)
+        lookup = {s: i for i, s in enumerate(known)}
+        strings = _strings(values)
+        uniq, inverse = np.unique(strings, return_inverse=True)
+        new = [s for s in uniq.tolist() if s not in lookup]
+        for s in new:
+            lookup[s] = len(lookup)
+        codes = np.array([lookup[s] for s in uniq.tolist()], dtype=np.int32)[inverse]
+        with open(os.path.join(path, col + ".codes"), "ab") as f:
+            f.write(codes.astype(np.int32).tobytes())
+        if new:
+            spec["dict_bytes"] += _append_bytes(os.path.join(path, col + ".dict"), _join(new),
+                                                first=spec["dict_size"] == 0)
+        spec["dict_size"] += len(new)
+    elif kind == "text":
+        data = [s.encode("utf-8") for s in _strings(values).tolist()]
+        ends = spec["bytes"] + np.cumsum([len(b) for b in data], dtype=np.int64)
+        with open(os.path.join(path, col + ".off"), "ab") as f:
+            f.write(ends.tobytes())
+        with open(os.path.join(path, col + ".txt"), "ab") as f:
+            f.write(b"".join(data))
+        spec["bytes"] = int(ends[-1])
+    else:  # "str"
+        strings = _strings(values).tolist()
+        spec["bytes"] += _append_bytes(os.path.join(path, col + ".str"), _join(strings),
+                                       first=rows_before == 0)
+
+
+def _spec_for(series: pd.Series) -> dict:
+    if not _is_string(series):
+        return {"kind": "array", "dtype": series.to_numpy().dtype.str}
+    if len(series) and series.nunique() <= DICT_RATIO * len(series):
+        return {"kind": "dict", "dict_size": 0, "dict_bytes": 0}
+    return {"kind": "text", "bytes": 0}
+
+
+# ----------------- WRITE -----------------
+def write_store(path: str, df: pd.DataFrame, attrs: Optional[dict] = None) -> None:
+    """Create (or overwrite) a store holding exactly ``df``.
+
+    ``attrs`` is saved in meta.json as-is (e.g. the parser version that
+    produced the rows) and kept across appends.
+    """
+    os.makedirs(path, exist_ok=True)
+    drop_store(path)  # the store is invalid until rewritten
+
+    meta = {"format": FORMAT_VERSION, "rows": 0, "attrs": attrs or {},
+            "columns": {col: _spec_for(df[col]) for col in df.columns}}
+    for col, spec in meta["columns"].items():
+        for ext in FILES[spec["kind"]]:
+            file = os.path.join(path, col + ext)
+            # Unlink rather than truncate: a reader still memory-mapping the
+            # old file keeps its pages instead of faulting on a shrunk file
+            if os.path.exists(file):
+                os.remove(file)
+            with open(file, "wb") as f:
+                if ext == ".off":  # the first string starts at offset 0
+                    f.write(np.zeros(1, dtype=np.int64).tobytes())
+    _write_meta(path, meta)
+    append_store(path, df)
+
+
+def append_store(path: str, df: pd.DataFrame) -> int:
+    """Append rows to an existing store; returns the new row count."""
+    meta = read_meta(path)
+    missing = set(meta["columns"]) - set(df.columns)
+    if missing:
+        raise ValueError(f"rows to append are missing columns: {sorted(missing)}")
+    if df.empty:
+        return meta["rows"]
+
+    for col, spec in meta["columns"].items():
+        # Drop any tail left behind by an append that died before meta.json
+        for name, size in _valid_sizes(col, spec, meta["rows"]).items():
+            os.truncate(os.path.join(path, name), size)
+        _encode(path, col, df[col], spec, meta["rows"])
+    meta["rows"] += len(df)
+    _write_meta(path, meta)
+    return meta["rows"]
+
+
+def _copy_prefix(file: str, size: int) -> None:
+    """Swap ``file`` for a new file holding its first ``size`` bytes."""
+    tmp = file + ".tmp"
+    with open(file, "rb") as src, open(tmp, "wb") as dst:
+        while size > 0:
+            chunk = src.read(min(size, COPY_CHUNK))
+            dst.write(chunk)
+            size -= len(chunk)
+    os.replace(tmp, file)
+
+
+def replace_tail(path: str, keep: int, df: pd.DataFrame) -> int:
+    """Replace the rows from ``keep`` on with ``df``; returns the new row count.
+
+    Each column file is swapped for a copy of its first ``keep`` rows' bytes
+    (dictionaries only grow, so they stay) and ``df`` is appended to it, so
+    only the new tail is encoded.
+    """
+    meta = read_meta(path)
+    if any(spec["kind"] == "str" for spec in meta["columns"].values()):
+        # NUL-joined columns can't be cut by row without decoding them all
+        head = read_store(path).iloc[:keep].copy(deep=True)  # detach from the files we rewrite
+        write_store(path, pd.concat([head, df[list(head.columns)]], ignore_index=True), attrs=meta["attrs"])
+        return len(head) + len(df)
+
+    drop_store(path)  # the store is invalid until the tail is appended
+    for col, spec in meta["columns"].items():
+        if spec["kind"] == "text":
+            spec["bytes"] = int(_map(os.path.join(path, col + ".off"), np.int64, meta["rows"] + 1)[keep])
+        for name, size in _valid_sizes(col, spec, keep).items():
+            if not name.endswith(".dict"):
+                _copy_prefix(os.path.join(path, name), size)
+    meta["rows"] = keep
+    _write_meta(path, meta)
+    return append_store(path, df)
+
+
+# ----------------- READ -----------------
+def _map(file: str, dtype, count: int) -> np.ndarray:
+    if count == 0:  # mmap can't map an empty file
+        return np.empty(0, dtype=dtype)
+    return np.memmap(file, dtype=dtype, mode="r", shape=(count,))
+
+
+def _text(path: str, col: str, spec: dict, n: int):
+    offsets = _map(os.path.join(path, col + ".off"), np.int64, n + 1)
+    data = _map(os.path.join(path, col + ".txt"), np.uint8, spec["bytes"])
+    if ARROW_STRINGS is None:
+        blob, bounds = data.tobytes(), offsets.tolist()
+        return np.array([blob[a:b].decode("utf-8") for a, b in zip(bounds, bounds[1:])], dtype=object)
+    # Arrow's large_string layout is exactly these two files: no copy
+    strings = pa.chunked_array([pa.LargeStringArray.from_buffers(n, pa.py_buffer(offsets), pa.py_buffer(data))])
+    if ARROW_STRINGS.storage == "pyarrow_numpy":
+        return ARROW_STRINGS.construct_array_type()(strings)
+    return pd.arrays.ArrowStringArray(strings, dtype=ARROW_STRINGS)
+
+
+def read_column(path: str, col: str, meta: Optional[dict] = None):
+    """One column: a read-only memmap for arrays, a Categorical (dictionary)
+    or Arrow string array (text) over memory-mapped files for strings."""
+    meta = meta or read_meta(path)
+    spec, n = meta["columns"][col], meta["rows"]
+    if spec["kind"] == "array":
+        return _map(os.path.join(path, col + ".bin"), np.dtype(spec["dtype"]), n)
+    if spec["kind"] == "dict":
+        # Small dictionaries get a narrower copy of the codes (1-2 bytes a row)
+        return pd.Categorical.from_codes(read_codes(path, col, meta),
+                                         categories=pd.Index(_dictionary(path, col, spec)), validate=False)
+    if spec["kind"] == "text":
+        return _text(path, col, spec, n)
+    return _split(_read_bytes(os.path.join(path, col + ".str"), spec["bytes"]), n)
+
+
+def read_codes(path: str, col: str, meta: Optional[dict] = None) -> np.ndarray:
+    """Memory-mapped int32 codes of a dictionary-encoded column."""
+    meta = meta or read_meta(path)
+    return _map(os.path.join(path, col + ".codes"), np.int32, meta["rows"])
+
+
+def read_store(path: str, columns: Optional[list[str]] = None) -> pd.DataFrame:
+    meta = read_meta(path)
+    columns = columns or list(meta["columns"])
+    # copy=False keeps the memmapped arrays as the frame's backing memory
+    return pd.DataFrame({col: read_column(path, col, meta) for col in columns}, copy=False)
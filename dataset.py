@@ -0,0 +1,312 @@
+# dataset.py
+import itertools
+import os
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from colstore import META_FILE, read_meta, read_store
+from indexes import AmountIndex, DateIndex, IdIndex, TextIndex
+from rollups import Rollups
+from shared import attach, publish, store_lock
+
+AMOUNT_COLUMNS = ["debit", "credit", "balance"]
+NO_AMOUNT = np.iinfo(np.int64).min  # int cents sentinel for a blank amount
+
+# Parser debugging columns: kept in the store and CSV export, never served
+UNSERVED_COLUMNS = ("raw",)
+
+
+def to_cents(values) -> np.ndarray:
+    """Vectorised '84,695.00' -> 8469500; blanks/garbage become NO_AMOUNT."""
+    s = pd.Series(values, dtype=object).fillna("").astype(str)
+    s = s.str.replace(",", "", regex=False).str.strip()
+    ok = s.str.fullmatch(r"-?\d+\.\d{2}").to_numpy(dtype=bool)
+
+    cents = np.full(len(s), NO_AMOUNT, dtype=np.int64)
+    cents[ok] = s[ok].str.replace(".", "", regex=False).astype(np.int64).to_numpy()
+    return cents
+
+
+def parse_amount(text: str) -> int:
+    """User input '84,695' / '-84695.5' -> int cents. Raises ValueError."""
+    try:
+        value = Decimal(text.replace(",", "").strip())
+    except InvalidOperation:
+        raise ValueError(f"not an amount: {text!r}") from None
+    if not value.is_finite():
+        raise ValueError(f"not an amount: {text!r}")
+    return int((value * 100).to_integral_value())
+
+
+def parse_date(text: str) -> date:
+    """User input '2024-07-02' or '02 JUL 24' -> date. Raises ValueError."""
+    text = text.strip().upper()
+    for fmt in ("%Y-%m-%d", "%d %b %y", "%d %b %Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"not a date: {text!r}")
+
+
+def add_typed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the int-cents and datetime64 columns derived from the text ones."""
+    for col in AMOUNT_COLUMNS:
+        if f"{col}_cents" not in df:
+            df[f"{col}_cents"] = to_cents(df[col])
+    if "date_dt" not in df:
+        df["date_dt"] = pd.to_datetime(df["date_iso"], format="%Y-%m-%d", errors="coerce")
+    return df
+
+
+def in_date_order(dates) -> bool:
+    """True if ``dates`` ascend, with any NaT at the end (as sort_by_date leaves them)."""
+    days = np.asarray(dates)
+    dated = len(days) - int(np.isnat(days).sum())
+    if np.isnat(days[:dated]).any():
+        return False
+    return dated < 2 or not (days[1:dated] < days[:dated - 1]).any()
+
+
+def sort_by_date(df: pd.DataFrame) -> pd.DataFrame:
+    """Stable date order (same-day rows keep statement order), NaT last.
+
+    Frames already in order are returned as-is, so a memory-mapped store
+    written in date order stays memory-mapped.
+    """
+    if in_date_order(df["date_dt"].to_numpy()):
+        return df
+    df = df.sort_values(["date_dt", "date"], kind="stable", na_position="last")
+    return df.reset_index(drop=True)
+
+
+# ----------------- DATASET -----------------
+_generations = itertools.count(1)
+
+
+class Dataset:
+    """The transactions frame plus the indexes the search routes read."""
+
+    INDEXES = ("dates", "ids", "amounts", "text", "rollups")
+
+    def __init__(self, df: pd.DataFrame, version: str = "", previous: Optional["Dataset"] = None,
+                 modified: float = 0.0, indexes: Optional[dict] = None):
+        self.version = version
+        self.generation = next(_generations)  # increases with every load; keys caches
+        self.modified = modified  # mtime of the data on disk
+        self.loaded_at = time.time()
+
+        # Keep rows in date order so every date and month is a contiguous range
+        df = sort_by_date(add_typed_columns(df))
+        self.df = df
+
+        if indexes is not None:  # built by another worker (see shared.py)
+            for name in self.INDEXES:
+                setattr(self, name, indexes[name])
+            return
+
+        self.dates = DateIndex(df["date_dt"], df["date"], df["date_iso"])
+        self.ids = IdIndex(df["id"])
+        self.amounts = AmountIndex(df["debit_cents"], df["credit_cents"], missing=NO_AMOUNT)
+
+        # Tokenising descriptions is the slowest build; after an append only
+        # the new rows are tokenised and merged into the previous index
+        kept = _kept_rows(previous, df)
+        if kept:
+            self.text = previous.text.extended(df["description"].iloc[kept:], offset=kept)
+        else:
+            self.text = TextIndex(df["description"])
+
+        # Totals for the aggregation endpoints; also only summed for new rows
+        self.rollups = previous.rollups.extended(df.iloc[kept:]) if kept else Rollups(df, missing=NO_AMOUNT)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def rows(self, positions) -> pd.DataFrame:
+        return self.df.iloc[positions]
+
+    def warm(self) -> None:
+        """Build the indexes that are otherwise built by their first query."""
+        self.ids.warm()
+        self.text.warm()
+
+    def indexes(self) -> dict:
+        """Everything ``Dataset(df, indexes=...)`` needs to skip the builds."""
+        return {"rows": len(self), **{name: getattr(self, name) for name in self.INDEXES}}
+
+
+def _kept_rows(previous: Optional[Dataset], df: pd.DataFrame) -> int:
+    """How many leading rows ``df`` shares with ``previous`` (0 unless all of them)."""
+    if previous is None or "fingerprint" not in df or "fingerprint" not in previous.df:
+        return 0
+    n = len(previous)
+    if n == 0 or len(df) < n:
+        return 0
+    same = np.array_equal(previous.df["fingerprint"].to_numpy(), df["fingerprint"].to_numpy()[:n])
+    return n if same else 0
+
+
+def _data_stat(path: str) -> Optional[os.stat_result]:
+    # meta.json is rewritten by every store write; a CSV is rewritten as a whole
+    target = os.path.join(path, META_FILE) if os.path.isdir(path) else path
+    try:
+        return os.stat(target)
+    except OSError:
+        return None
+
+
+def data_stamp(path: str) -> str:
+    """Changes whenever the data at ``path`` changes."""
+    st = _data_stat(path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}" if st else ""
+
+
+def load_dataset(path: str, previous: Optional[Dataset] = None, shared: bool = False) -> Dataset:
+    """Load a columnar store directory, or a legacy transactions.csv.
+
+    ``previous`` is the dataset being replaced; indexes that can be
+    extended with just the appended rows are. With ``shared``, indexes
+    another worker already built for this version are memory-mapped
+    instead, or built, warmed and saved for the others.
+    """
+    if shared and os.path.isdir(path):
+        with store_lock(path):
+            return _load_shared(path, previous)
+    st = _data_stat(path)
+    stamp = dict(version=data_stamp(path), modified=st.st_mtime if st else 0.0)
+    if os.path.isdir(path):
+        columns = [c for c in read_meta(path)["columns"] if c not in UNSERVED_COLUMNS]
+        return Dataset(read_store(path, columns=columns), previous=previous, **stamp)
+    df = pd.read_csv(path, dtype=str).fillna("")
+    return Dataset(df, **stamp)
+
+
+def _load_shared(path: str, previous: Optional[Dataset]) -> Dataset:
+    st = _data_stat(path)
+    version = data_stamp(path)
+    columns = [c for c in read_meta(path)["columns"] if c not in UNSERVED_COLUMNS]
+    df = read_store(path, columns=columns)
+    indexes = attach(path, version, len(df), Dataset.INDEXES)
+    data = Dataset(df, version=version, modified=st.st_mtime if st else 0.0, previous=previous,
+                   indexes=indexes)
+    if indexes is None:
+        data.warm()
+        publish(path, version, data.indexes())
+        print(f"📄 Built indexes for {len(data)} rows (version {version}), shared with other workers")
+    return data
+
+
+# ----------------- HOT RELOAD -----------------
+class LiveDataset:
+    """The Dataset currently being served, replaceable without a restart.
+
+    A reload builds the new Dataset and all its indexes off to the side and
+    then swaps one reference. Readers take ``live.current`` once per request
+    and use only that snapshot, so a request running during a swap sees
+    either the old data or the new data, never a mix.
+    """
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared  # one of several worker processes (see shared.py)
+        self.current: Optional[Dataset] = None  # None until the first load finishes
+        self.phase = "starting"  # -> ingesting -> loading -> ready, or failed
+        self.started_at = time.time()
+        self.reloads = 0
+        self.last_error = ""
+        self._failed_stamp: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.current is not None
+
+    def progress(self) -> dict:
+        return {"status": "ready" if self.ready else "loading", "phase": self.phase,
+                "elapsed": round(time.time() - self.started_at, 1),
+                "rows": len(self.current) if self.ready else None,
+                "last_error": self.last_error}
+
+    def start(self, prepare: Optional[Callable[[], object]] = None) -> None:
+        """The first load, after ``prepare()`` (e.g. ingesting statements).
+        Not done in __init__, so a process that only spawns workers never
+        loads the data itself. A failed start is retried by the watcher."""
+        with self._reload_lock:
+            try:
+                if prepare is not None:
+                    self.phase = "ingesting"
+                    prepare()
+                self.phase = "loading"
+                self.current = load_dataset(self.path, shared=self.shared)
+            except Exception as e:
+                self.phase, self._failed_stamp = "failed", data_stamp(self.path)
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Loading {self.path} failed: {self.last_error}")
+                return
+            self.phase = "ready"
+            self.last_error = ""
+            self._warm(self.current)
+            print(f"✅ Loaded {self.path}: {len(self.current)} rows in {time.time() - self.started_at:.1f}s")
+
+    def start_in_background(self, prepare: Optional[Callable[[], object]] = None) -> None:
+        """start() in a thread, so the server answers health checks meanwhile."""
+        threading.Thread(target=self.start, args=(prepare,), name="dataset-start", daemon=True).start()
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_lock.locked()
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild from disk if the data changed. Returns True if swapped."""
+        with self._reload_lock:
+            # Before the first successful load, retry only once the data changes
+            stamp = data_stamp(self.path)
+            if not force and stamp == (self.current.version if self.ready else self._failed_stamp):
+                return False
+            if not self.ready:
+                self.phase = "loading"
+            try:
+                fresh = load_dataset(self.path, previous=None if force else self.current, shared=self.shared)
+            except Exception as e:  # keep serving the old snapshot, if any
+                if not self.ready:
+                    self.phase, self._failed_stamp = "failed", stamp
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Reload of {self.path} failed: {self.last_error}")
+                return False
+            self.current = fresh
+            self._warm(fresh)
+            self.reloads += 1
+            self.phase = "ready"
+            self.last_error = ""
+            print(f"🔁 Reloaded {self.path}: {len(fresh)} rows (version {fresh.version})")
+            return True
+
+    @staticmethod
+    def _warm(data: Dataset) -> None:
+        # Substring indexes take seconds on big stores; serve while they build
+        threading.Thread(target=data.warm, name="dataset-warm", daemon=True).start()
+
+    def reload_in_background(self, force: bool = False) -> bool:
+        """Start a reload thread. False if a reload is already running."""
+        if self.reloading:
+            return False
+        threading.Thread(target=self.reload, kwargs={"force": force}, daemon=True).start()
+        return True
+
+    def watch(self, interval: float) -> None:
+        """Poll the data's mtime and reload when it changes, until stop()."""
+        def loop():
+            while not self._stop.wait(interval):
+                self.reload()
+        threading.Thread(target=loop, name="dataset-watch", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,120 @@
+# execution.py
+"""Where route work runs: two thread-pool lanes with their own limits.
+
+* ``fast``: index lookups and small pages. Never queued behind a scan.
+* ``slow``: anything that can touch every row (substring scans, fuzzy
+  amount matching, IDs within some edits) and rendering or streaming big
+  results.
+
+Each call gets the lane's timeout (504 when exceeded), as does each chunk of
+a streamed response, and is abandoned when the client disconnects. Work still queued is dropped outright; work already
+running can't be interrupted mid numpy call, but its result is discarded and
+a streamed response stops at the next chunk.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Union
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+FAST_ROWS = 5_000  # results above this many rows are rendered on the slow lane
+DISCONNECT_POLL = 0.25  # seconds between client-disconnect checks
+
+
+class Lane:
+    def __init__(self, name: str, workers: int, timeout: float):
+        self.name, self.workers, self.timeout = name, workers, timeout
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"lane-{name}")
+        self._lock = threading.Lock()
+        self.queued = self.running = 0
+        self.completed = self.timeouts = self.cancelled = 0
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _call(self, fn, args, kwargs):
+        self._count(queued=-1, running=1)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._count(running=-1, completed=1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "timeout": self.timeout, "queued": self.queued,
+                    "running": self.running, "completed": self.completed,
+                    "timeouts": self.timeouts, "cancelled": self.cancelled}
+
+
+LANES = {
+    "fast": Lane("fast", int(os.environ.get("FAST_WORKERS", "8")),
+                 float(os.environ.get("FAST_TIMEOUT", "5"))),
+    "slow": Lane("slow", int(os.environ.get("SLOW_WORKERS", "2")),
+                 float(os.environ.get("SLOW_TIMEOUT", "60"))),
+}
+
+
+def rows_lane(rows: int) -> str:
+    return "slow" if rows > FAST_ROWS else "fast"
+
+
+async def run(lane: str, request: Request, fn: Callable, /, *args, **kwargs):
+    """``fn(*args, **kwargs)`` on ``lane``, bounded by its timeout and by the
+    client staying connected."""
+    lane = LANES[lane]
+    lane._count(queued=1)
+    future = lane.pool.submit(lane._call, fn, args, kwargs)
+    wrapped = asyncio.wrap_future(future)
+    deadline = asyncio.get_running_loop().time() + lane.timeout
+    try:
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                lane._count(timeouts=1)
+                raise HTTPException(status_code=504, detail=f"query exceeded {lane.timeout:g}s")
+            done, _ = await asyncio.wait({wrapped}, timeout=min(DISCONNECT_POLL, remaining))
+            if done:
+                return wrapped.result()
+            if await request.is_disconnected():
+                lane._count(cancelled=1)
+                return Response(status_code=499)  # nobody is listening
+    finally:
+        if not future.done() and future.cancel():  # still queued: never runs
+            lane._count(queued=-1)
+
+
+def in_lane(choose: Union[str, Callable[..., str]]):
+    """Run a sync route on a lane. ``choose`` is a lane name, or a function
+    of the route's keyword arguments returning one."""
+    def wrap(route):
+        @functools.wraps(route)
+        async def endpoint(**kwargs):
+            lane = choose(**kwargs) if callable(choose) else choose
+            return await run(lane, kwargs["request"], route, **kwargs)
+        return endpoint
+    return wrap
+
+
+async def iterate(chunks: Iterable, lane: str):
+    """Stream a sync chunk generator, producing each chunk on ``lane``. A
+    chunk that takes longer than the lane's timeout aborts the response: its
+    headers are already sent, so it can't become a 504, and a dropped
+    connection tells the client the file is incomplete."""
+    lane = LANES[lane]
+    loop = asyncio.get_running_loop()
+    it, done = iter(chunks), object()
+    while True:
+        try:
+            chunk = await asyncio.wait_for(loop.run_in_executor(lane.pool, next, it, done), lane.timeout)
+        except asyncio.TimeoutError:
+            lane._count(timeouts=1)
+            raise TimeoutError(f"stream chunk exceeded {lane.timeout:g}s") from None
+        if chunk is done:
+            return
+        yield chunk
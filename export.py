@@ -0,0 +1,193 @@
+# export.py
+"""Search results as downloadable files: CSV, NDJSON or XLSX.
+
+Every format is produced CHUNK_ROWS rows at a time, straight from the
+Dataset's column arrays, so an export of millions of rows holds one chunk
+in memory, never the whole result.
+
+XLSX is written with the standard library: a zip (streamed, sizes in data
+descriptors) of a minimal workbook whose sheets use inline strings. A sheet
+holds at most SHEET_ROWS rows; longer exports continue on further sheets.
+"""
+import csv
+import io
+import json
+import re
+import zipfile
+from typing import Iterator, Optional
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+from dataset import NO_AMOUNT
+
+CHUNK_ROWS = 5000
+SHEET_ROWS = 1_048_575  # Excel's limit, less the header row
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def values(df: pd.DataFrame, field: str, take: np.ndarray) -> list:
+    """``field`` of the rows at ``take``; None for a blank amount or text."""
+    column = df[field].array[take].to_numpy()  # converts just these rows, not the whole column
+    if field.endswith("_cents"):
+        return [None if v == NO_AMOUNT else v for v in column.tolist()]
+    if column.dtype == object:
+        column[pd.isna(column)] = None
+    return column.tolist()
+
+
+def _chunks(rows: int, positions: Optional[np.ndarray]) -> Iterator[np.ndarray]:
+    # positions=None means every row; those are never materialised at once
+    total = rows if positions is None else len(positions)
+    for start in range(0, total, CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, total)
+        yield np.arange(start, stop, dtype=np.int64) if positions is None else positions[start:stop]
+
+
+# ----------------- CSV / NDJSON -----------------
+def csv_chunks(df: pd.DataFrame, fields: list[str], positions: Optional[np.ndarray]) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(fields)
+    for take in _chunks(len(df), positions):
+        writer.writerows(zip(*(values(df, f, take) for f in fields)))
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    if out.tell():  # header of an empty export
+        yield out.getvalue()
+
+
+def ndjson_chunks(df: pd.DataFrame, fields: list[str], positions: Optional[np.ndarray]) -> Iterator[str]:
+    for take in _chunks(len(df), positions):
+        columns = [values(df, f, take) for f in fields]
+        yield "".join(json.dumps(dict(zip(fields, row)), separators=(",", ":")) + "\n"
+                      for row in zip(*columns))
+
+
+# ----------------- XLSX -----------------
+NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+SEPARATOR = "\x00"  # between the cells of a joined column (so it's left in by ILLEGAL_BETWEEN)
+ILLEGAL_BETWEEN = re.compile(r"[\x01-\x08\x0b\x0c\x0e-\x1f]")
+AMOUNT_FIELDS = ("debit", "credit", "balance")  # written as numbers when their cents are known
+
+
+class _Sink:
+    """Write-only file for ZipFile; what's written is collected until drained."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def _text_cell(value) -> str:
+    if value is None or value != value:  # blank or NaN
+        return "<c/>"
+    text = escape(ILLEGAL_XML.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _text_cells(items: list) -> list[str]:
+    # Cleaned and escaped as one string per column, then split: a few calls
+    # per chunk rather than a few per cell
+    blank = pd.isna(np.array(items, dtype=object))
+    joined = SEPARATOR.join("" if b else str(v) for v, b in zip(items, blank))
+    if joined.count(SEPARATOR) != len(items) - 1:  # a value holds one itself
+        return [_text_cell(v) for v in items]
+    texts = escape(ILLEGAL_BETWEEN.sub("", joined)).split(SEPARATOR)
+    return ["<c/>" if b else f'<c t="inlineStr"><is><t xml:space="preserve">{t}</t></is></c>'
+            for t, b in zip(texts, blank)]
+
+
+def _number_cells(cents: list) -> list[str]:
+    return ["<c/>" if c is None else
+            f"<c><v>{'-' if c < 0 else ''}{abs(c) // 100}.{abs(c) % 100:02d}</v></c>" for c in cents]
+
+
+def _cells(df: pd.DataFrame, field: str, take: np.ndarray) -> list[str]:
+    if field.endswith("_cents"):
+        return ["<c/>" if v is None else f"<c><v>{v}</v></c>" for v in values(df, field, take)]
+    if field in AMOUNT_FIELDS and f"{field}_cents" in df:
+        return _number_cells(values(df, f"{field}_cents", take))
+    return _text_cells(values(df, field, take))
+
+
+def _workbook(sheets: int) -> dict[str, str]:
+    names = range(1, sheets + 1)
+    return {
+        "[Content_Types].xml": XML_HEAD +
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>' +
+            "".join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                    for i in names) +
+            "</Types>",
+        "_rels/.rels": XML_HEAD +
+            f'<Relationships xmlns="{PKG_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>",
+        "xl/workbook.xml": XML_HEAD +
+            f'<workbook xmlns="{NS}" xmlns:r="{REL_NS}"><sheets>' +
+            "".join(f'<sheet name="transactions{"" if i == 1 else f" {i}"}" sheetId="{i}" r:id="rId{i}"/>'
+                    for i in names) +
+            "</sheets></workbook>",
+        "xl/_rels/workbook.xml.rels": XML_HEAD +
+            f'<Relationships xmlns="{PKG_REL_NS}">' +
+            "".join(f'<Relationship Id="rId{i}" Type="{REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                    for i in names) +
+            "</Relationships>",
+    }
+
+
+def xlsx_chunks(df: pd.DataFrame, fields: list[str], positions: Optional[np.ndarray]) -> Iterator[bytes]:
+    sink = _Sink()
+    header = "<row>" + "".join(_text_cell(f) for f in fields) + "</row>"
+    total = len(df) if positions is None else len(positions)
+    sheets = max(1, -(-total // SHEET_ROWS))
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as book:
+        for sheet in range(sheets):
+            lo, hi = sheet * SHEET_ROWS, min((sheet + 1) * SHEET_ROWS, total)
+            part = None if positions is None else positions[lo:hi]
+            with book.open(f"xl/worksheets/sheet{sheet + 1}.xml", "w") as xml:
+                xml.write(f'{XML_HEAD}<worksheet xmlns="{NS}"><sheetData>{header}'.encode())
+                for take in _chunks(hi - lo, part):
+                    if part is None:
+                        take = take + lo
+                    columns = [_cells(df, f, take) for f in fields]
+                    xml.write("".join("<row>" + "".join(row) + "</row>" for row in zip(*columns)).encode())
+                    data = sink.drain()
+                    if data:  # the compressor may still be holding it all
+                        yield data
+                xml.write(b"</sheetData></worksheet>")
+        for name, xml in _workbook(sheets).items():
+            book.writestr(name, xml)
+    yield sink.drain()  # the rest, and the zip's central directory
+
+
+def chunks(format: str, df: pd.DataFrame, fields: list[str], positions: Optional[np.ndarray]) -> Iterator:
+    """The rows of ``df`` at ``positions`` (None = every row) as ``format``."""
+    writer = {"csv": csv_chunks, "ndjson": ndjson_chunks, "xlsx": xlsx_chunks}[format]
+    return writer(df, fields, positions)
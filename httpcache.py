@@ -0,0 +1,122 @@
+# httpcache.py
+"""HTTP caching and compression for the search pages and the API.
+
+A response is a pure function of the dataset version and the request URL, so
+its ETag is a hash of the two. The middleware pins the dataset snapshot the
+route will read, answers a matching If-None-Match / If-Modified-Since with
+304 before any search runs, and stamps ETag and Last-Modified on 200s.
+"""
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.middleware.gzip import GZipMiddleware
+
+try:  # optional: brotli for clients that accept it, gzip for the rest
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+COMPRESS_MIN_BYTES = 1024
+UNCACHED_PREFIXES = ("/admin", "/static", "/docs", "/openapi.json", "/healthz", "/readyz")
+LOADING_RETRY_AFTER = 5  # seconds, suggested to clients while the data loads
+
+
+def digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:20]
+
+
+def snapshot(request: Request):
+    """The Dataset this request was validated against (see ``install``)."""
+    data = getattr(request.state, "data", None)
+    return data if data is not None else request.app.state.live.current
+
+
+def _not_modified(request: Request, etag: str, modified: float) -> bool:
+    match = request.headers.get("if-none-match")
+    if match is not None:
+        return etag in (tag.strip() for tag in match.split(",")) or match.strip() == "*"
+    since = request.headers.get("if-modified-since")
+    if since and modified:
+        try:
+            return int(modified) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# ----------------- STATIC ASSETS -----------------
+class StaticAsset:
+    """A small file served from memory with a content-hash URL, so browsers
+    can cache it for a year and a changed file gets a new URL."""
+
+    def __init__(self, name: str, media_type: str):
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            self.body = f.read()
+        self.media_type = media_type
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:20]}"'
+        self.url = f"/static/{name}?v={self.etag.strip(chr(34))[:12]}"
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "public, max-age=31536000, immutable"}
+        if _not_modified(request, self.etag, 0):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
+
+
+# ----------------- MIDDLEWARE -----------------
+def install(app: FastAPI, salt: str = "", loading: Optional[Callable[[Request], Response]] = None,
+            pages: Tuple[str, ...] = ()) -> None:
+    """Conditional GETs for every data route, then compression.
+
+    ``salt`` goes into every ETag; pass something that changes with the page
+    markup (e.g. the stylesheet hash) so a redeploy isn't answered with 304.
+    Until the first dataset is loaded, data routes answer 503 with
+    ``loading(request)`` (a JSON status by default). ``pages`` are paths whose
+    response doesn't read the data (e.g. the home page): they're served
+    while it loads and their ETag depends on ``salt`` alone.
+    """
+
+    @app.middleware("http")
+    async def conditional_get(request: Request, call_next):
+        if request.method not in ("GET", "HEAD") or request.url.path.startswith(UNCACHED_PREFIXES):
+            return await call_next(request)
+
+        if request.url.path in pages:
+            etag = f'W/"{digest(salt, request.url.path)}"'
+            if _not_modified(request, etag, 0):
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+            response = await call_next(request)
+            if response.status_code == 200:
+                response.headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+            return response
+
+        data = request.app.state.live.current
+        if data is None:
+            response = loading(request) if loading else JSONResponse(request.app.state.live.progress())
+            response.status_code = 503
+            response.headers.update({"Retry-After": str(LOADING_RETRY_AFTER), "Cache-Control": "no-store"})
+            return response
+        request.state.data = data
+        query = "&".join(sorted(request.url.query.split("&")))
+        etag = f'W/"{digest(data.version, salt, request.url.path, query)}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if data.modified:
+            headers["Last-Modified"] = formatdate(data.modified, usegmt=True)
+        if _not_modified(request, etag, data.modified):
+            return Response(status_code=304, headers=headers)
+
+        response = await call_next(request)
+        if response.status_code == 200:
+            response.headers.update(headers)
+        return response
+
+    # Added last, so it wraps everything (including the 304s above)
+    if BrotliMiddleware is not None:
+        app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+    else:
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES)
@@ -0,0 +1,537 @@
+# indexes.py
+import copy
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _upper_bound(prefix: str) -> str:
+    """Smallest string greater than every string starting with ``prefix``."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _gather(values: np.ndarray, starts: np.ndarray, runs: np.ndarray) -> np.ndarray:
+    """``values[starts[r]:starts[r + 1]]`` for every r in ``runs``, concatenated."""
+    lengths = starts[runs + 1] - starts[runs]
+    if not lengths.sum():
+        return EMPTY
+    offsets = np.repeat(starts[runs] - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return values[np.arange(lengths.sum()) + offsets]
+
+
+# ----------------- TRIGRAM INDEX -----------------
+GRAM = 3
+GRAM_CHUNK = 200_000  # strings per vectorised build step
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 once it's known to exceed ``limit``."""
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+class NgramIndex:
+    """Trigram index over an array of distinct strings (IDs, description terms).
+
+    Each trigram of the utf-8 bytes maps to the sorted indexes of the strings
+    containing it. A substring query intersects the postings of its trigrams,
+    rarest first, and verifies the few survivors; a fuzzy query keeps the
+    strings sharing enough trigrams to be within the edit budget.
+    """
+
+    def __init__(self, strings):
+        self._strings = np.asarray(strings, dtype=str)
+        # (trigram << 32 | string index), so one in-place sort orders postings
+        packed = []
+        for start in range(0, len(self._strings), GRAM_CHUNK):
+            raw = np.char.encode(self._strings[start:start + GRAM_CHUNK], "utf-8")
+            width = raw.dtype.itemsize
+            if width < GRAM:
+                continue
+            b = np.ascontiguousarray(raw).view(np.uint8).reshape(len(raw), width).astype(np.uint64)
+            grams = (b[:, :-2] << 16) | (b[:, 1:-1] << 8) | b[:, 2:]
+            valid = np.arange(width - GRAM + 1) < (np.char.str_len(raw) - GRAM + 1)[:, None]
+            rows, _ = np.nonzero(valid)
+            packed.append((grams[valid] << 32) | (rows + start).astype(np.uint64))
+        packed = np.concatenate(packed) if packed else np.empty(0, dtype=np.uint64)
+        packed.sort()
+        keep = np.ones(len(packed), dtype=bool)
+        keep[1:] = packed[1:] != packed[:-1]
+        packed = packed[keep]
+
+        keys = (packed >> 32).astype(np.uint32)
+        self._postings = (packed & 0xFFFFFFFF).astype(np.int32)
+        del packed
+        self._keys, first = np.unique(keys, return_index=True)
+        self._starts = np.append(first, len(keys)).astype(np.int64)
+
+    @staticmethod
+    def grams(text: str) -> np.ndarray:
+        b = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint32)
+        if len(b) < GRAM:
+            return np.empty(0, dtype=np.uint32)
+        return np.unique((b[:-2] << 16) | (b[1:-1] << 8) | b[2:])
+
+    def _postings_of(self, gram) -> np.ndarray:
+        i = np.searchsorted(self._keys, gram)
+        if i == len(self._keys) or self._keys[i] != gram:
+            return np.empty(0, dtype=np.int32)
+        return self._postings[self._starts[i]:self._starts[i + 1]]
+
+    def containing(self, sub: str) -> np.ndarray:
+        """Sorted indexes of the strings containing ``sub``."""
+        grams = self.grams(sub)
+        if not len(grams):
+            # Too short to have a trigram: one vectorised pass over the strings
+            return np.flatnonzero(np.char.find(self._strings, sub) >= 0)
+        lists = sorted((self._postings_of(g) for g in grams), key=len)
+        cand = lists[0]
+        for other in lists[1:]:
+            if not len(cand):
+                break
+            cand = np.intersect1d(cand, other, assume_unique=True)
+        return cand[np.char.find(self._strings[cand], sub) >= 0].astype(np.int64)
+
+    def similar(self, text: str, max_edits: int) -> np.ndarray:
+        """Sorted indexes of the strings within ``max_edits`` edits of ``text``."""
+        grams = self.grams(text)
+        # One edit destroys at most GRAM trigrams (the q-gram lemma)
+        need = len(grams) - GRAM * max_edits
+        if need > 0:
+            shared, counts = np.unique(np.concatenate([self._postings_of(g) for g in grams]),
+                                       return_counts=True)
+            cand = shared[counts >= need]
+        else:
+            cand = np.arange(len(self._strings))
+        lengths = np.char.str_len(self._strings[cand])
+        cand = cand[np.abs(lengths - len(text)) <= max_edits]
+        hits = [c for c in cand.tolist() if _edit_distance(text, self._strings[c], max_edits) <= max_edits]
+        return np.asarray(hits, dtype=np.int64)
+
+
+# ----------------- ID INDEX -----------------
+class IdIndex:
+    """Exact (hash) and prefix (sorted range) lookups over the ``id`` column.
+
+    Lookups return sorted int64 row positions into the frame the index was
+    built from, so callers can ``df.iloc[positions]`` directly.
+    """
+
+    def __init__(self, ids):
+        values = np.asarray(ids, dtype=str)
+        keep = np.flatnonzero(values != "")
+        order = keep[np.argsort(values[keep], kind="stable")]
+
+        self._sorted = values[order]
+        self._order = order.astype(np.int64)
+
+        # One run per distinct ID in the sorted array; the hash map points
+        # each ID at its run so exact hits never touch the sorted array.
+        uniq, starts = np.unique(self._sorted, return_index=True)
+        self._starts = np.append(starts, len(self._sorted)).astype(np.int64)
+        self._runs = dict(zip(uniq.tolist(), range(len(uniq))))
+        self._grams = None  # trigram index over distinct IDs, built on first use
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def _slice(self, lo: int, hi: int) -> np.ndarray:
+        return np.sort(self._order[lo:hi])
+
+    def __getstate__(self) -> dict:
+        # A dict can't be memory-mapped: a copy loaded by another process
+        # (see shared.py) answers exact lookups by binary search instead
+        return {**self.__dict__, "_runs": None}
+
+    def exact(self, id: str) -> np.ndarray:
+        if self._runs is None:
+            if len(id) > self._sorted.dtype.itemsize // 4:
+                return EMPTY
+            lo = np.searchsorted(self._sorted, id, side="left")
+            hi = np.searchsorted(self._sorted, id, side="right")
+            return self._slice(lo, hi) if hi > lo else EMPTY
+        run = self._runs.get(id)
+        if run is None:
+            return EMPTY
+        return self._slice(self._starts[run], self._starts[run + 1])
+
+    def _prefix_range(self, prefix: str) -> tuple[int, int]:
+        if not prefix or len(prefix) > self._sorted.dtype.itemsize // 4:
+            return 0, 0
+        lo = np.searchsorted(self._sorted, prefix, side="left")
+        hi = np.searchsorted(self._sorted, _upper_bound(prefix), side="left")
+        return int(lo), int(hi)
+
+    def count_prefix(self, prefix: str) -> int:
+        lo, hi = self._prefix_range(prefix)
+        return hi - lo
+
+    def prefix(self, prefix: str) -> np.ndarray:
+        lo, hi = self._prefix_range(prefix)
+        if hi <= lo:
+            return EMPTY
+        return self._slice(lo, hi)
+
+    def prefix_totals(self, length: int, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Distinct ``length``-character ID prefixes, and for each the column
+        sums of ``values`` (one row per dataset row) over its rows."""
+        if not len(self._sorted):
+            return np.empty(0, dtype=str), np.zeros((0,) + values.shape[1:], dtype=values.dtype)
+        prefixes = self._sorted.astype(f"<U{length}")  # truncates; still sorted
+        starts = np.flatnonzero(np.concatenate([[True], prefixes[1:] != prefixes[:-1]]))
+        return prefixes[starts], np.add.reduceat(values[self._order], starts, axis=0)
+
+    @property
+    def grams(self) -> NgramIndex:
+        if self._grams is None:
+            self._grams = NgramIndex(self._sorted[self._starts[:-1]])
+        return self._grams
+
+    def warm(self) -> None:
+        """Build the trigram index now rather than on the first query needing it."""
+        self._grams = self.grams
+
+    def _rows_of_runs(self, runs: np.ndarray) -> np.ndarray:
+        return np.sort(_gather(self._order, self._starts, runs))
+
+    def contains(self, sub: str) -> np.ndarray:
+        """Rows whose ID contains ``sub`` anywhere."""
+        if not sub:
+            return EMPTY
+        return self._rows_of_runs(self.grams.containing(sub))
+
+    def similar(self, id: str, max_edits: int = 1) -> np.ndarray:
+        """Rows whose ID is within ``max_edits`` edits of ``id`` (typos)."""
+        if not id:
+            return EMPTY
+        return self._rows_of_runs(self.grams.similar(id, max_edits))
+
+    def search(self, query: str) -> np.ndarray:
+        """Exact hit first, otherwise every ID starting with ``query``."""
+        query = query.strip()
+        hits = self.exact(query)
+        if len(hits):
+            return hits
+        return self.prefix(query)
+
+
+# ----------------- AMOUNT INDEX -----------------
+class AmountIndex:
+    """Sorted-array index over the debit and credit columns (int cents).
+
+    Amounts are indexed by magnitude, so 84695.00 finds a debit printed as
+    -84695.00. Every query is a pair of binary searches.
+    """
+
+    def __init__(self, *columns, missing: int):
+        values, positions = [], []
+        for col in columns:
+            col = np.asarray(col, dtype=np.int64)
+            keep = np.flatnonzero(col != missing)
+            values.append(np.abs(col[keep]))
+            positions.append(keep.astype(np.int64))
+        values = np.concatenate(values) if values else EMPTY
+        positions = np.concatenate(positions) if positions else EMPTY
+
+        order = np.argsort(values, kind="stable")
+        self._values = values[order]
+        self._positions = positions[order]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _range(self, lo: Optional[int], hi: Optional[int]) -> tuple[int, int]:
+        start = 0 if lo is None else np.searchsorted(self._values, lo, side="left")
+        stop = len(self._values) if hi is None else np.searchsorted(self._values, hi, side="right")
+        return int(start), int(stop)
+
+    def count_between(self, lo: Optional[int] = None, hi: Optional[int] = None) -> int:
+        """Indexed amounts within [lo, hi]; an upper bound on matching rows."""
+        start, stop = self._range(lo, hi)
+        return max(stop - start, 0)
+
+    def between(self, lo: Optional[int] = None, hi: Optional[int] = None) -> np.ndarray:
+        """Rows with a debit or credit whose magnitude is within [lo, hi] cents."""
+        start, stop = self._range(lo, hi)
+        if stop <= start:
+            return EMPTY
+        # A row can match on both debit and credit, so dedupe while sorting
+        return np.unique(self._positions[start:stop])
+
+    def exact(self, cents: int) -> np.ndarray:
+        return self.between(abs(cents), abs(cents))
+
+    def near(self, cents: int, tolerance: int) -> np.ndarray:
+        return self.between(max(abs(cents) - abs(tolerance), 0), abs(cents) + abs(tolerance))
+
+
+# ----------------- DATE INDEX -----------------
+class DateIndex:
+    """Range and partial-text lookups over rows already sorted by date.
+
+    Because rows are sorted, every distinct date is one contiguous run of
+    positions. Text queries like "02 JUL" are matched against the few
+    thousand run labels instead of every row, and ranges are two binary
+    searches over the datetime64 column.
+    """
+
+    def __init__(self, dates, *labels):
+        days = np.asarray(dates, dtype="datetime64[D]")
+        labels = [np.asarray(col, dtype=object) for col in labels]
+        n = len(days)
+
+        change = np.ones(n, dtype=bool)
+        for col in labels:
+            change[1:] |= col[1:] != col[:-1]
+        starts = np.flatnonzero(change)
+
+        self._days = days[:n - int(np.isnat(days).sum())]  # NaT rows sort last
+        self._starts = np.append(starts, n).astype(np.int64)
+        self._labels = pd.DataFrame({i: col[starts] for i, col in enumerate(labels)})
+
+    def __len__(self) -> int:
+        return len(self._starts) - 1
+
+    def span(self, lo=None, hi=None) -> tuple[int, int]:
+        """[start, stop) positions of the rows dated within [lo, hi]."""
+        start = 0 if lo is None else np.searchsorted(self._days, np.datetime64(lo, "D"), side="left")
+        stop = len(self._days) if hi is None else np.searchsorted(self._days, np.datetime64(hi, "D"), side="right")
+        return int(start), int(stop)
+
+    def between(self, lo=None, hi=None) -> np.ndarray:
+        """Rows dated within [lo, hi]; either bound may be None."""
+        start, stop = self.span(lo, hi)
+        if stop <= start:
+            return EMPTY
+        return np.arange(start, stop, dtype=np.int64)
+
+    def matching(self, text: str) -> np.ndarray:
+        """Rows whose date text contains ``text`` (case-insensitive)."""
+        hit = np.zeros(len(self), dtype=bool)
+        for col in self._labels:
+            hit |= self._labels[col].astype(str).str.contains(text, case=False, regex=False).to_numpy()
+        runs = np.flatnonzero(hit)
+        if not len(runs):
+            return EMPTY
+        return np.concatenate([np.arange(self._starts[r], self._starts[r + 1], dtype=np.int64) for r in runs])
+
+
+# ----------------- TEXT INDEX -----------------
+TOKEN_RX = r"[A-Z0-9]+"
+MAX_TOKEN = 32  # longer tokens are cut, so one garbage run can't widen every term
+SCAN_FRACTION = 0.2  # substring candidates beyond this share of rows: just scan
+NARROW_RATIO = 4     # skip intersecting postings this much larger than the candidates
+TEXT_CHUNK = 500_000  # rows tokenised at a time
+
+
+def query_groups(query: str, prefix: bool = False) -> list[list[tuple[str, bool]]]:
+    """Parse 'funds transfer OR ibft*' into OR-groups of AND-ed (term, is_prefix).
+
+    A trailing ``*`` (or ``prefix=True``) makes a word a prefix match. A word
+    with punctuation ('30,543.52') needs all of its tokens.
+    """
+    groups, group = [], []
+    for word in query.split():
+        if word in ("OR", "|"):
+            groups.append(group)
+            group = []
+            continue
+        is_prefix = prefix or word.endswith("*")
+        tokens = [t[:MAX_TOKEN] for t in re.findall(TOKEN_RX, word.rstrip("*").upper())]
+        group += [(t, is_prefix and i == len(tokens) - 1) for i, t in enumerate(tokens)]
+    groups.append(group)
+    return [g for g in groups if g]
+
+
+class TextIndex:
+    """Inverted index: each token of a text column -> sorted row positions.
+
+    Terms are kept sorted, and the posting lists are laid end to end in term
+    order, so a prefix's postings are one contiguous slice. ``extended``
+    indexes only appended rows and merges them in.
+    """
+
+    # Positions of terms cut at MAX_TOKEN, found on first use (a class default,
+    # so indexes shared by older code still load)
+    _cut: Optional[np.ndarray] = None
+
+    def __init__(self, texts, offset: int = 0):
+        texts = np.asarray(texts, dtype=object)
+        self._grams = None  # trigram index over the terms, built on first use
+        # Tokenise a chunk at a time so only one chunk's token strings are alive
+        self._index_chunk(texts[:TEXT_CHUNK], offset)
+        for start in range(TEXT_CHUNK, len(texts), TEXT_CHUNK):
+            self._merge(TextIndex(texts[start:start + TEXT_CHUNK], offset + start))
+
+    def _index_chunk(self, texts: np.ndarray, offset: int) -> None:
+        s = pd.Series(texts, dtype=object).fillna("").astype(str).str.upper()
+        tokens = s.str.findall(TOKEN_RX).explode().dropna().str[:MAX_TOKEN]
+        rows = tokens.index.to_numpy(dtype=np.int64) + offset
+        codes, terms = pd.factorize(tokens.to_numpy(dtype=object))
+        self._build(np.asarray(terms, dtype=object), codes, rows)
+
+    def _build(self, terms: np.ndarray, codes: np.ndarray, rows: np.ndarray) -> None:
+        # Renumber codes in sorted-term order, then sort postings by (term, row)
+        order = np.argsort(terms.astype(str), kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        codes = rank[codes]
+        by = np.lexsort((rows, codes))
+        codes, rows = codes[by], rows[by]
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+
+        self._terms = terms[order].astype(str) if len(order) else np.empty(0, dtype="<U1")
+        self._postings = rows[keep]
+        counts = np.bincount(codes[keep], minlength=len(order))
+        self._starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def extended(self, texts, offset: int) -> "TextIndex":
+        """A new index over these rows plus ``texts`` at positions offset, offset+1, ..."""
+        merged = copy.copy(self)
+        merged._grams = merged._cut = None
+        merged._merge(TextIndex(texts, offset))
+        return merged
+
+    def _merge(self, new: "TextIndex") -> None:
+        """Fold in ``new``, whose rows all come after this index's rows.
+
+        The two sorted term lists are merged with binary searches, and every
+        posting list keeps its old rows first, so nothing is re-sorted.
+        """
+        old_terms, new_terms = self._terms, new._terms
+
+        at = np.searchsorted(old_terms, new_terms)
+        found = np.zeros(len(new_terms), dtype=bool)
+        inside = at < len(old_terms)
+        found[inside] = old_terms[at[inside]] == new_terms[inside]
+        missing = new_terms[~found]
+
+        # Slot of every term in the merged (still sorted) term list
+        old_to = np.arange(len(old_terms)) + np.searchsorted(missing, old_terms)
+        miss_to = np.searchsorted(old_terms, missing) + np.arange(len(missing))
+        new_to = np.empty(len(new_terms), dtype=np.int64)
+        new_to[found] = old_to[at[found]]
+        new_to[~found] = miss_to
+
+        n_terms = len(old_terms) + len(missing)
+        terms = np.empty(n_terms, dtype=np.promote_types(old_terms.dtype, new_terms.dtype))
+        terms[old_to] = old_terms
+        terms[miss_to] = missing
+
+        old_counts, new_counts = np.diff(self._starts), np.diff(new._starts)
+        counts = np.zeros(n_terms, dtype=np.int64)
+        counts[old_to] += old_counts
+        counts[new_to] += new_counts
+        starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        # Move each posting list to its merged slot, new rows after old ones
+        postings = np.empty(starts[-1], dtype=np.int64)
+        shift = np.repeat(starts[old_to] - self._starts[:-1], old_counts)
+        postings[np.arange(len(self._postings)) + shift] = self._postings
+        before = np.zeros(len(new_terms), dtype=np.int64)
+        before[found] = old_counts[at[found]]
+        shift = np.repeat(starts[new_to] + before - new._starts[:-1], new_counts)
+        postings[np.arange(len(new._postings)) + shift] = new._postings
+
+        self._terms, self._starts, self._postings = terms, starts, postings
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def _range(self, term: str, prefix: bool) -> tuple[int, int]:
+        if not term or len(term) > self._terms.dtype.itemsize // 4:
+            return 0, 0
+        lo = int(np.searchsorted(self._terms, term, side="left"))
+        if prefix:
+            return lo, int(np.searchsorted(self._terms, _upper_bound(term), side="left"))
+        return lo, lo + int(lo < len(self._terms) and self._terms[lo] == term)
+
+    def count(self, term: str, prefix: bool = False) -> int:
+        """Postings under ``term``: exact for a term, an upper bound for a prefix."""
+        lo, hi = self._range(term, prefix)
+        return int(self._starts[hi] - self._starts[lo])
+
+    def lookup(self, term: str, prefix: bool = False) -> np.ndarray:
+        lo, hi = self._range(term, prefix)
+        if hi <= lo:
+            return EMPTY
+        postings = self._postings[self._starts[lo]:self._starts[hi]]
+        return postings if hi - lo == 1 else np.unique(postings)
+
+    @property
+    def grams(self) -> NgramIndex:
+        if self._grams is None:
+            self._grams = NgramIndex(self._terms)
+        return self._grams
+
+    def warm(self) -> None:
+        """Build the trigram index now rather than on the first query needing it."""
+        self._grams = self.grams
+
+    @property
+    def cut(self) -> np.ndarray:
+        """Terms that were cut at MAX_TOKEN: any token may lie past the cut."""
+        if self._cut is None:
+            if self._terms.dtype.itemsize // 4 < MAX_TOKEN:
+                self._cut = EMPTY
+            else:
+                self._cut = np.flatnonzero(np.char.str_len(self._terms) >= MAX_TOKEN)
+        return self._cut
+
+    def candidates(self, sub: str, rows: int) -> Optional[np.ndarray]:
+        """Rows that may contain the substring ``sub``, or None when the index
+        can't narrow it enough to beat scanning all ``rows``. Every token of
+        ``sub`` lies inside some term of a matching row, or past the end of a
+        term cut at MAX_TOKEN; callers verify the candidates against the text
+        itself."""
+        tokens = [t for t in re.findall(TOKEN_RX, sub.upper()) if len(t) >= GRAM]
+        # Terms containing each token, and how many postings they'd pull in
+        options = []
+        for token in set(tokens):
+            terms = np.union1d(self.grams.containing(token), self.cut)
+            options.append((int((self._starts[terms + 1] - self._starts[terms]).sum()), terms))
+        options.sort(key=lambda st: st[0])
+        if not options or options[0][0] > rows * SCAN_FRACTION:
+            return None
+
+        cand = None
+        for size, terms in options:
+            if cand is not None and size > NARROW_RATIO * len(cand):
+                break  # cheaper to let verification drop the rest
+            hits = np.unique(_gather(self._postings, self._starts, terms))
+            cand = hits if cand is None else np.intersect1d(cand, hits, assume_unique=True)
+            if not len(cand):
+                break
+        return cand
+
+    def estimate(self, groups: list[list[tuple[str, bool]]]) -> int:
+        """Upper bound on match(groups): sum over groups of the rarest term."""
+        return sum(min(self.count(t, p) for t, p in group) for group in groups)
+
+    def match(self, groups: list[list[tuple[str, bool]]]) -> np.ndarray:
+        """Rows matching any group, where a group needs all of its terms."""
+        hits = []
+        for group in groups:
+            # Intersect rarest first so the candidate set only shrinks
+            group = sorted(group, key=lambda tp: self.count(*tp))
+            rows = self.lookup(*group[0])
+            for term, prefix in group[1:]:
+                if not len(rows):
+                    break
+                rows = np.intersect1d(rows, self.lookup(term, prefix), assume_unique=True)
+            hits.append(rows)
+        if not hits:
+            return EMPTY
+        return hits[0] if len(hits) == 1 else np.unique(np.concatenate(hits))
@@ -0,0 +1,194 @@
+# layout.py
+"""Statement columns by where words sit on the page.
+
+Flattened page text loses the columns: a row whose debit is left blank has
+two amounts, and the parser can only guess they are the credit and the
+balance. Here the x range of each column is learned once per document, from
+the transaction rows on its first pages (or, failing that, from where the
+headings are printed), and every word of every page is then put in its
+column by position:
+
+    date  description ...  | value date | debit | credit | balance
+
+Pages still come out as text, one line per printed line, with the column
+fields after the narrative separated by COLUMN_SEP. The parse cache, line
+classifier and record stitching work on them unchanged. Only words shaped
+like a date or an amount go in a column, so page numbers and headings that
+happen to sit above one stay in the narrative.
+"""
+import bisect
+import re
+import statistics
+from typing import Iterable, Optional
+
+COLUMN_SEP = "\t"
+FIELDS = ("value_date", "debit", "credit", "balance")
+AMOUNT_FIELDS = FIELDS[1:]
+
+LINE_TOLERANCE = 3  # points between the tops of words printed on one line
+LEARN_PAGES = 3     # pages read to learn the columns
+LEARN_ROWS = 50     # transaction rows that are enough to learn from
+MIN_ROWS = 3        # fewer than this and the columns aren't trusted
+SLACK = 4           # points a word may start left of its column's learned edge
+MIN_GAP = 10        # points between the centres of two neighbouring columns
+
+AMOUNT = re.compile(r"-?(?:\d{1,3}(?:,\d{3})+|\d+)\.\d{2}")
+DATE = re.compile(r"\d{2} [A-Z]{3} \d{2}")
+
+
+def lines(words: list[dict]) -> list[list[dict]]:
+    """pdfplumber words grouped into printed lines, top to bottom, each in
+    x order."""
+    rows, top = [], None
+    for w in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if top is None or w["top"] - top > LINE_TOLERANCE:
+            rows.append([])
+            top = w["top"]
+        rows[-1].append(w)
+    return [sorted(row, key=lambda w: w["x0"]) for row in rows]
+
+
+def _date_at(line: list[dict], i: int) -> bool:
+    return i + 3 <= len(line) and DATE.fullmatch(" ".join(w["text"] for w in line[i:i + 3])) is not None
+
+
+def _span(words: list[dict]) -> tuple[float, float]:
+    return min(w["x0"] for w in words), max(w["x1"] for w in words)
+
+
+def _consensus(spans: list[tuple[float, float]]) -> tuple[float, float]:
+    """The x range of the ``spans`` that overlap their median span, so a few
+    strays (an amount printed in a narrative) can't stretch a column."""
+    lo, hi = statistics.median(s[0] for s in spans), statistics.median(s[1] for s in spans)
+    return _bounds([s for s in spans if s[0] <= hi and s[1] >= lo])
+
+
+def _bounds(spans: list[tuple[float, float]]) -> tuple[float, float]:
+    return min(s[0] for s in spans), max(s[1] for s in spans)
+
+
+def _in_order(ranges: dict[str, tuple[float, float]], order: tuple[str, ...]) -> bool:
+    """True if ``ranges`` sit left to right in ``order`` without overlapping."""
+    spans = [ranges[f] for f in order if f in ranges]
+    return all(a[1] < b[0] for a, b in zip(spans, spans[1:]))
+
+
+def _split(spans: list[tuple[float, float]]) -> Optional[tuple[list, list]]:
+    """``spans`` in two groups, left and right of the widest gap between
+    their centres; None if there's no clear gap."""
+    spans = sorted(spans, key=lambda s: s[0] + s[1])
+    centres = [(x0 + x1) / 2 for x0, x1 in spans]
+    gaps = [b - a for a, b in zip(centres, centres[1:])]
+    if not gaps or max(gaps) < MIN_GAP:
+        return None
+    cut = gaps.index(max(gaps)) + 1
+    return spans[:cut], spans[cut:]
+
+
+class Columns:
+    """The learned x ranges of a document's value date (optional), debit,
+    credit and balance columns."""
+
+    def __init__(self, ranges: dict[str, tuple[float, float]]):
+        self.ranges = ranges
+        order = sorted(ranges, key=lambda f: ranges[f][0])
+        self.fields = order
+        # A word goes in the column its centre falls in; neighbouring
+        # columns meet halfway between their learned ranges
+        self.edges = [ranges[order[0]][0] - SLACK] + [
+            (ranges[a][1] + ranges[b][0]) / 2 for a, b in zip(order, order[1:])
+        ]
+
+    @property
+    def key(self) -> str:
+        """Short signature, for cache keys: page text depends on the columns."""
+        return ",".join(f"{f}:{x0:.0f}-{x1:.0f}" for f, (x0, x1) in sorted(self.ranges.items()))
+
+    @classmethod
+    def learn(cls, pages: Iterable[list[dict]]) -> Optional["Columns"]:
+        """Columns from the words of a document's first pages, or None if
+        they can't be told apart. Learned ranges that come out of order or
+        overlapping give way to the headings."""
+        samples = {f: [] for f in FIELDS}
+        singles = []  # the amount beside the balance on rows leaving debit or credit blank
+        headings = None
+        rows = 0
+        for words in pages:
+            for line in lines(words):
+                texts = [w["text"].upper() for w in line]
+                if headings is None and all(h in texts for h in ("DEBIT", "CREDIT", "BALANCE")):
+                    headings = {f: line[texts.index(f.upper())] for f in AMOUNT_FIELDS}
+                # Transaction rows say where each column is. The columns
+                # follow the last date on the row (the value date, or the
+                # row's own), so amounts in the narrative before it don't count
+                if not _date_at(line, 0):
+                    continue
+                dates = [i for i in range(3, len(line) - 2) if _date_at(line, i)]
+                start = dates[-1] + 3 if dates else 3
+                amounts = [i for i in range(start, len(line)) if AMOUNT.fullmatch(line[i]["text"])][-3:]
+                if len(amounts) < 2:
+                    continue
+                if len(amounts) == 3:
+                    for f, i in zip(AMOUNT_FIELDS, amounts):
+                        samples[f].append(_span([line[i]]))
+                else:
+                    singles.append(_span([line[amounts[0]]]))
+                    samples["balance"].append(_span([line[amounts[1]]]))
+                if dates:
+                    samples["value_date"].append(_span(line[dates[-1]:dates[-1] + 3]))
+                rows += 1
+            if rows >= LEARN_ROWS:
+                break
+
+        # Debit left of credit unless the headings say not
+        order = FIELDS
+        if headings and headings["credit"]["x0"] < headings["debit"]["x0"]:
+            order = ("value_date", "credit", "debit", "balance")
+
+        if len(samples["debit"]) < MIN_ROWS and singles:
+            # Rows print a debit or a credit, never both: those amounts fall
+            # in two clusters
+            groups = _split(singles)
+            if groups:
+                left, right = groups if order[1] == "debit" else groups[::-1]
+                samples["debit"] += left
+                samples["credit"] += right
+
+        if rows >= MIN_ROWS and all(samples[f] for f in AMOUNT_FIELDS):
+            ranges = {f: _consensus(spans) for f, spans in samples.items() if spans}
+            if len(samples["value_date"]) * 2 < rows or not _in_order(ranges, order[:2]):
+                ranges.pop("value_date", None)  # not a column, just dates in narratives
+            if _in_order(ranges, order):
+                return cls(ranges)
+        if headings is not None and _in_order({f: _span([w]) for f, w in headings.items()}, order):
+            # Amounts can be wider than their heading and right-aligned to it
+            return cls({f: (w["x0"] - (w["x1"] - w["x0"]), w["x1"]) for f, w in headings.items()})
+        return None
+
+    def _field(self, word: dict) -> Optional[str]:
+        i = bisect.bisect_right(self.edges, (word["x0"] + word["x1"]) / 2) - 1
+        return self.fields[i] if i >= 0 else None
+
+    def page_text(self, words: list[dict]) -> str:
+        """The page as lines of narrative text, followed by the column
+        fields when any of them holds something."""
+        out = []
+        for line in lines(words):
+            narrative, held = [], {f: [] for f in self.fields}
+            for w in line:
+                f = self._field(w)
+                (held[f] if f else narrative).append(w)
+
+            fields = dict.fromkeys(FIELDS, "")
+            for f, ws in held.items():
+                text = " ".join(w["text"] for w in ws)
+                if ws and (DATE if f == "value_date" else AMOUNT).fullmatch(text):
+                    fields[f] = text
+                else:  # not what this column holds
+                    narrative += ws
+
+            text = " ".join(w["text"] for w in sorted(narrative, key=lambda w: w["x0"]))
+            if any(fields.values()):
+                text += COLUMN_SEP + COLUMN_SEP.join(fields[f] for f in FIELDS)
+            out.append(text)
+        return "\n".join(out)
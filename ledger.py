@@ -0,0 +1,108 @@
+# ledger.py
+"""Ingestion ledger: which transactions the store already holds.
+
+Every stored row carries a ``fingerprint`` (a stable 64-bit hash of its
+identifying fields). Ingesting a batch keeps only the rows the store does
+not have yet, so re-feeding a statement, feeding overlapping statements or
+feeding them out of order never duplicates or drops a transaction.
+
+Amounts are fingerprinted as int cents, a blank one as 0, so a transaction
+is recognised however a statement printed it ("1,250.00" or "1250.00", a
+blank cell or "0.00").
+
+Fingerprints are compared as a multiset: a batch holding the same
+transaction twice (two identical transfers on one day) keeps both copies
+unless the store already has two.
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from colstore import append_store, read_column, read_meta, read_store, replace_tail, store_exists, write_store
+from dataset import AMOUNT_COLUMNS, NO_AMOUNT, in_date_order, sort_by_date, to_cents
+
+FINGERPRINT_COLUMNS = ["account", "date", "id", "debit", "credit", "balance"]
+FINGERPRINT_VERSION = 2  # store attr; stores fingerprinted by older code are redone
+
+
+def fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """Stable uint64 fingerprint of each row's identifying fields."""
+    key = df[[c for c in FINGERPRINT_COLUMNS if c not in AMOUNT_COLUMNS]].fillna("").astype(str)
+    for col in AMOUNT_COLUMNS:
+        cents = df[f"{col}_cents"].to_numpy() if f"{col}_cents" in df else to_cents(df[col])
+        key[col] = np.where(cents == NO_AMOUNT, 0, cents)
+    return pd.util.hash_pandas_object(key, index=False).to_numpy(dtype=np.uint64)
+
+
+def _stored_fingerprints(store_dir: str) -> np.ndarray:
+    meta = read_meta(store_dir)
+    attrs = meta.get("attrs", {})
+    if "fingerprint" not in meta["columns"] or attrs.get("fingerprint_version") != FINGERPRINT_VERSION:
+        # Store written before the ledger existed, or fingerprinted another
+        # way: fingerprint it once
+        df = read_store(store_dir).copy(deep=True)  # detach from the files we rewrite
+        df["fingerprint"] = fingerprints(df)
+        write_store(store_dir, df, attrs={**attrs, "fingerprint_version": FINGERPRINT_VERSION})
+        meta = read_meta(store_dir)
+    return read_column(store_dir, "fingerprint", meta)
+
+
+def unseen(df: pd.DataFrame, ledger: np.ndarray) -> np.ndarray:
+    """Boolean mask of the rows of ``df`` that ``ledger`` doesn't hold yet."""
+    fp = df["fingerprint"].to_numpy(dtype=np.uint64)
+    if not len(fp):
+        return np.zeros(0, dtype=bool)
+
+    # n-th copy of a fingerprint within the batch (0, 1, ...)
+    occurrence = pd.Series(fp).groupby(fp).cumcount().to_numpy()
+
+    # How many copies the store already has, looking only at batch fingerprints
+    held = ledger[np.isin(ledger, np.unique(fp))]
+    known, counts = np.unique(held, return_counts=True)
+    have = np.zeros(len(fp), dtype=np.int64)
+    if len(known):
+        idx = np.searchsorted(known, fp).clip(max=len(known) - 1)
+        hit = known[idx] == fp
+        have[hit] = counts[idx[hit]]
+    return occurrence >= have
+
+
+def upsert(store_dir: str, df: pd.DataFrame, attrs: Optional[dict] = None) -> tuple[int, int]:
+    """Add the rows of ``df`` the store doesn't hold. Returns (added, skipped).
+
+    ``attrs`` only applies when this call creates the store.
+    """
+    df = df.copy()
+    df["fingerprint"] = fingerprints(df)
+
+    if not store_exists(store_dir):
+        attrs = {**(attrs or {}), "fingerprint_version": FINGERPRINT_VERSION}
+        write_store(store_dir, sort_by_date(df), attrs=attrs)
+        return len(df), 0
+
+    fresh = sort_by_date(df[unseen(df, _stored_fingerprints(store_dir))].reset_index(drop=True))
+    meta = read_meta(store_dir)
+    stored = read_column(store_dir, "date_dt", meta)
+    keep = _merge_point(stored, fresh["date_dt"].to_numpy())
+    if keep < len(stored):
+        # Rows dated before the store's last ones: rewrite the rows from the
+        # earliest new date on in date order, so every reader can map the
+        # store as it is instead of sorting a copy
+        if not in_date_order(stored):  # appended out of order by older code
+            keep = 0
+        tail = read_store(store_dir).iloc[keep:]
+        merged = pd.concat([tail, fresh[list(tail.columns)]], ignore_index=True)
+        replace_tail(store_dir, keep, sort_by_date(merged).copy(deep=True))  # detach from the files we rewrite
+    else:
+        append_store(store_dir, fresh)
+    return len(fresh), len(df) - len(fresh)
+
+
+def _merge_point(stored: np.ndarray, new: np.ndarray) -> int:
+    """How many leading rows of the date-ordered ``stored`` dates stay where
+    they are when rows dated ``new`` are merged in (undated rows go last)."""
+    dated = new[~np.isnat(new)]
+    if not len(dated):
+        return len(stored)
+    return int(np.searchsorted(stored, dated.min(), side="left"))
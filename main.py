@@ -1,17 +1,75 @@
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+import argparse
+import ipaddress
+import os
+from contextlib import asynccontextmanager
+from html import escape
+from typing import Callable, Iterator, Optional
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+import numpy as np
 import pandas as pd
 import uvicorn
-from pdf_parser import parse_pdf_to_csv
-
-# Ensure CSV exists
-csv_file = "transactions.csv"
-parse_pdf_to_csv("STMT.ENT.BOOK1.pdf", csv_file)
-
-# Load CSV into DataFrame
-df = pd.read_csv(csv_file, dtype=str).fillna("")
-
-app = FastAPI()
+from pdf_parser import parse_pdf_to_dataset
+from colstore import STORE_DIR
+from cache import ResultCache, query_key
+from dataset import LiveDataset
+from shared import store_lock
+import api
+import execution
+import httpcache
+import search
+from execution import in_lane, rows_lane
+from httpcache import StaticAsset, snapshot
+
+# STATEMENTS may be one PDF, a directory or a glob; run
+# `python pdf_parser.py <dir> --watch` to keep ingesting.
+statements = os.environ.get("STATEMENTS", "STMT.ENT.BOOK1.pdf")
+store_dir = os.environ.get("STORE_DIR", STORE_DIR)
+
+# Several worker processes (`python main.py --workers N`, or WEB_CONCURRENCY=N
+# with uvicorn's --workers) share one copy of the indexes (see shared.py)
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+# The memory-mapped store and its lookup indexes, loaded at startup and
+# reloaded in place when the store changes. Each request reads one snapshot
+# of it (httpcache.snapshot).
+live = LiveDataset(store_dir, shared=WORKERS > 1)
+
+# Seconds between checks of the store for new data (0 = only /admin/reload)
+RELOAD_INTERVAL = float(os.environ.get("RELOAD_INTERVAL", "5"))
+# Without a token the admin routes only answer clients on this machine
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+
+def ingest_statements() -> None:
+    """Ensure the columnar store exists; with several workers only the first
+    to get the lock parses, the rest find the statements already ingested."""
+    with store_lock(store_dir):
+        parse_pdf_to_dataset(statements, store_dir)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load in the background so the port is bound (and /healthz answers)
+    # while big statements are still being parsed
+    live.start_in_background(prepare=ingest_statements)
+    if RELOAD_INTERVAL > 0:
+        live.watch(RELOAD_INTERVAL)
+    yield
+    live.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.state.live = live
+app.include_router(api.router)
+
+# The stylesheet is its own long-cached asset; pages are revalidated by ETag
+STYLE = StaticAsset("style.css", "text/css; charset=utf-8")
+STYLE_URL = STYLE.url
+
+@app.get("/static/style.css", include_in_schema=False)
+def style(request: Request):
+    return STYLE.response(request)
 
 # ----------------- BASE HTML + CSS -----------------
 def base_html(body: str) -> str:
@@ -21,64 +79,7 @@ def base_html(body: str) -> str:
       <meta charset="utf-8" />
       <meta name="viewport" content="width=device-width, initial-scale=1" />
       <title>D WATSON - Transaction Search</title>
-      <style>
-        :root {{
-          --bg: #0b1220;
-          --card: #11182a;
-          --muted: #9fb0c3;
-          --text: #e7eef8;
-          --accent: #3aa1ff;
-          --accent-2: #19c37d;
-          --danger: #ff5b5b;
-          --border: #21314a;
-        }}
-        * {{ box-sizing: border-box; }}
-        body {{
-          margin: 0; padding: 20px;
-          font-family: system-ui, -apple-system, Segoe UI, Roboto, "Helvetica Neue", Arial, "Noto Sans", "Liberation Sans";
-          background: radial-gradient(1200px 800px at 10% -20%, #1a2850, transparent),
-                      radial-gradient(1200px 800px at 90% 120%, #0c3c4c, transparent),
-                      var(--bg);
-          color: var(--text);
-        }}
-        .container {{ max-width: 1000px; margin: 0 auto; }}
-        .title {{ font-size: 26px; font-weight: 700; text-align: center; margin: 10px 0 18px; }}
-        .subtitle {{ font-size: 16px; color: var(--muted); text-align: center; margin-bottom: 25px; }}
-        .card {{
-          background: linear-gradient(180deg, #121a2e 0%, #0f1729 100%);
-          border: 1px solid var(--border);
-          border-radius: 16px; padding: 20px;
-        }}
-        .grid {{ display: grid; gap: 16px; grid-template-columns: repeat(auto-fit, minmax(280px, 1fr)); }}
-        .field {{ display: flex; flex-direction: column; gap: 8px; background: #0c1324; border: 1px solid var(--border); border-radius: 12px; padding: 14px; }}
-        label {{ font-size: 13px; color: var(--muted); }}
-        input[type="text"] {{
-          width: 100%; padding: 12px 14px; border-radius: 10px;
-          border: 1px solid #25324a; background: #0a1120;
-          color: var(--text); outline: none; font-size: 14px;
-        }}
-        input[type="text"]::placeholder {{ color: #7f91a8; }}
-        .btn {{
-          display: inline-flex; align-items: center; justify-content: center;
-          padding: 10px 14px; border-radius: 10px; font-weight: 600; font-size: 14px;
-          border: 1px solid #264e7b; background: linear-gradient(180deg, #0d6efd 0%, #0b5ed7 100%);
-          color: white; text-decoration: none; cursor: pointer;
-        }}
-        .btn.secondary {{ background: #141c31; border: 1px solid var(--border); color: #d3e2f4; }}
-        .btn:hover {{ filter: brightness(1.06); }}
-        .actions {{ display: flex; gap: 10px; flex-wrap: wrap; margin-top: 12px; }}
-        table {{
-          width: 100%; border-collapse: collapse; margin-top: 18px;
-          background: #0b1325; border: 1px solid var(--border);
-        }}
-        thead th {{ background: #0f1a32; color: #cbd8ea; padding: 10px; font-size: 13px; }}
-        tbody td {{ padding: 10px; font-size: 14px; border-top: 1px solid #182642; }}
-        tbody tr:hover {{ background: #0e1a33; }}
-        .badge {{ padding: 3px 8px; border-radius: 999px; font-size: 12px; }}
-        .badge.credit {{ background: rgba(25,195,125,.15); color: #86f3c4; border: 1px solid rgba(25,195,125,.35); }}
-        .badge.debit  {{ background: rgba(255,91,91,.12); color: #ff9c9c; border: 1px solid rgba(255,91,91,.28); }}
-        .footer {{ margin-top: 24px; color: var(--muted); font-size: 13px; text-align: center; }}
-      </style>
+      <link rel="stylesheet" href="{STYLE_URL}" />
     </head>
     <body>
       <div class="container">
@@ -91,6 +92,97 @@ def base_html(body: str) -> str:
     </html>
     """
 
+# Streamed pages send the page shell in two pieces around the table
+PAGE_START, PAGE_END = base_html("\0").split("\0")
+
+# ----------------- HEALTH -----------------
+def loading_page(request: Request) -> Response:
+    """What data routes answer (as 503) until the first load finishes."""
+    progress = live.progress()
+    if request.url.path.startswith(api.router.prefix):
+        return JSONResponse(progress)
+    state = "failed, retrying" if progress["phase"] == "failed" else f"{progress['phase']}…"
+    body = f"""
+      <meta http-equiv="refresh" content="{httpcache.LOADING_RETRY_AFTER}" />
+      <div class="title">⏳ Loading transactions</div>
+      <div class="card">
+        {escape(state)} ({progress['elapsed']:g}s). This page refreshes by itself once the data is ready.
+      </div>
+    """
+    return HTMLResponse(base_html(body))
+
+httpcache.install(app, salt=STYLE.etag, loading=loading_page, pages=("/",))
+
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    """The process is up (even while the data is still loading)."""
+    return {"status": "alive"}
+
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    """200 once searches can be served, 503 with load progress until then."""
+    return JSONResponse(live.progress(), status_code=200 if live.ready else 503)
+
+# ----------------- STREAMED TABLES -----------------
+TABLE_COLUMNS = ["date", "date_iso", "description", "id", "value_date", "debit", "credit", "balance"]
+ROW_HTML = """
+          <tr>
+            <td>{}</td>
+            <td>{}</td>
+            <td>{}</td>
+            <td>{}</td>
+            <td>{}</td>
+            <td><span class="badge debit">{}</span></td>
+            <td><span class="badge credit">{}</span></td>
+            <td>{}</td>
+          </tr>
+        """
+TABLE_HEAD = """
+        <table>
+          <thead>
+            <tr>
+              <th>date</th><th>date_iso</th><th>description</th><th>id</th>
+              <th>value_date</th><th>debit</th><th>credit</th><th>balance</th>
+            </tr>
+          </thead>
+          <tbody>"""
+TABLE_END = """</tbody>
+        </table>"""
+CHUNK_ROWS = 1000  # rows rendered per yielded chunk
+
+
+def table_rows(df: pd.DataFrame, positions: np.ndarray) -> Iterator[str]:
+    """``<tr>`` markup for ``df`` rows at ``positions``, CHUNK_ROWS at a time,
+    formatted straight from the column arrays."""
+    columns = [df[c].array if c in df else None for c in TABLE_COLUMNS]
+    for start in range(0, len(positions), CHUNK_ROWS):
+        take = positions[start:start + CHUNK_ROWS]
+        cells = [  # converts just these rows, not the whole column
+            [escape(str(v)) for v in col[take].to_numpy()] if col is not None else [""] * len(take)
+            for col in columns
+        ]
+        yield "".join(ROW_HTML.format(*row) for row in zip(*cells))
+
+
+def table_page(title: str, df: pd.DataFrame, positions: np.ndarray, footer: str = "") -> Iterator[str]:
+    """Page header first, then the table in chunks, then the footer."""
+    yield PAGE_START
+    yield f"""
+      <div class="title">{title}</div>
+      <div class="card">{TABLE_HEAD}"""
+    yield from table_rows(df, positions)
+    yield f"""{TABLE_END}
+        {footer}
+        <div class="actions"><a class="btn secondary" href="/">← Back</a></div>
+      </div>
+    """
+    yield PAGE_END
+
+
+def stream_table(title: str, df: pd.DataFrame, positions: np.ndarray, footer: str = "") -> StreamingResponse:
+    return StreamingResponse(execution.iterate(table_page(title, df, positions, footer), rows_lane(len(positions))),
+                             media_type="text/html; charset=utf-8")
+
 # ----------------- HOME PAGE -----------------
 @app.get("/", response_class=HTMLResponse)
 def home():
@@ -106,6 +198,15 @@ def home():
             </div>
           </form>
 
+          <form class="field" action="/search-date" method="get">
+            <label>By Date Range (from / to)</label>
+            <input name="from" placeholder="from e.g. 2024-07-01">
+            <input name="to" placeholder="to e.g. 31 JUL 24">
+            <div class="actions">
+              <button class="btn" type="submit">Search Range</button>
+            </div>
+          </form>
+
           <form class="field" action="/search-amount" method="get">
             <label>By Amount (credit/debit)</label>
             <input name="amount" placeholder="e.g. 84695.00 or -84695.00">
@@ -121,6 +222,14 @@ def home():
               <button class="btn" type="submit">Search by ID</button>
             </div>
           </form>
+
+          <form class="field" action="/search-description" method="get">
+            <label>By Description (words, OR, prefix*)</label>
+            <input name="q" placeholder="e.g. funds transfer OR ibft*">
+            <div class="actions">
+              <button class="btn" type="submit">Search Descriptions</button>
+            </div>
+          </form>
         </div>
       </div>
     """
@@ -128,57 +237,31 @@ def home():
 
 # ----------------- CSV PREVIEW WITH PAGINATION -----------------
 @app.get("/preview", response_class=HTMLResponse)
-def preview(page: int = 1, per_page: int = 100):
+@in_lane(lambda per_page=100, **_: rows_lane(per_page))
+def preview(request: Request, page: int = 1, per_page: int = Query(100, ge=1)):
+    df = snapshot(request).df
     total_rows = len(df)
     total_pages = (total_rows // per_page) + (1 if total_rows % per_page else 0)
 
-    start = (page - 1) * per_page
-    end = start + per_page
-    chunk = df.iloc[start:end]
-
-    rows_html = ""
-    for _, r in chunk.iterrows():
-        rows_html += f"""
-          <tr>
-            <td>{r.get('date','')}</td>
-            <td>{r.get('date_iso','')}</td>
-            <td>{r.get('description','')}</td>
-            <td>{r.get('id','')}</td>
-            <td>{r.get('value_date','')}</td>
-            <td><span class="badge debit">{r.get('debit','')}</span></td>
-            <td><span class="badge credit">{r.get('credit','')}</span></td>
-            <td>{r.get('balance','')}</td>
-          </tr>
-        """
+    start = max(page - 1, 0) * per_page
+    positions = np.arange(start, min(start + per_page, total_rows))
 
-    pagination_html = f"<div class='actions'>"
+    pagination_html = "<div class='actions'>"
     if page > 1:
         pagination_html += f"<a class='btn secondary' href='/preview?page={page-1}&per_page={per_page}'>← Prev</a>"
     if page < total_pages:
         pagination_html += f"<a class='btn secondary' href='/preview?page={page+1}&per_page={per_page}'>Next →</a>"
     pagination_html += f"<span style='margin:auto;color:#9fb0c3'>Page {page} of {total_pages}</span></div>"
 
-    table = f"""
-      <div class="title">📄 CSV Preview ({total_rows} rows)</div>
-      <div class="card">
-        <table>
-          <thead>
-            <tr>
-              <th>date</th><th>date_iso</th><th>description</th><th>id</th>
-              <th>value_date</th><th>debit</th><th>credit</th><th>balance</th>
-            </tr>
-          </thead>
-          <tbody>{rows_html}</tbody>
-        </table>
-        {pagination_html}
-        <div class="actions"><a class="btn secondary" href="/">← Back</a></div>
-      </div>
-    """
-    return base_html(table)
+    return stream_table(f"📄 CSV Preview ({total_rows} rows)", df, positions, footer=pagination_html)
 
 # ----------------- RENDER RESULTS -----------------
-def render_results(results: "pd.DataFrame") -> str:
-    if results.empty:
+# Whole rendered pages of small results, per dataset generation
+pages = ResultCache()
+PAGE_CACHE_ROWS = 500  # bigger results are streamed, never held as one string
+
+def results_page(df: pd.DataFrame, positions: np.ndarray) -> Iterator[str]:
+    if not len(positions):
         body = """
           <div class="title">No results found</div>
           <div class="card">
@@ -186,63 +269,128 @@ def render_results(results: "pd.DataFrame") -> str:
             <div class="actions"><a class="btn secondary" href="/">← Back</a></div>
           </div>
         """
-        return base_html(body)
-
-    rows_html = ""
-    for _, r in results.iterrows():
-        rows_html += f"""
-          <tr>
-            <td>{r.get('date','')}</td>
-            <td>{r.get('date_iso','')}</td>
-            <td>{r.get('description','')}</td>
-            <td>{r.get('id','')}</td>
-            <td>{r.get('value_date','')}</td>
-            <td><span class="badge debit">{r.get('debit','')}</span></td>
-            <td><span class="badge credit">{r.get('credit','')}</span></td>
-            <td>{r.get('balance','')}</td>
-          </tr>
-        """
-
-    table = f"""
-      <div class="title">🔎 Results ({len(results)} found)</div>
-      <div class="card">
-        <table>
-          <thead>
-            <tr>
-              <th>date</th><th>date_iso</th><th>description</th><th>id</th>
-              <th>value_date</th><th>debit</th><th>credit</th><th>balance</th>
-            </tr>
-          </thead>
-          <tbody>{rows_html}</tbody>
-        </table>
-        <div class="actions"><a class="btn secondary" href="/">← Back</a></div>
-      </div>
-    """
-    return base_html(table)
+        yield base_html(body)
+        return
+    yield from table_page(f"🔎 Results ({len(positions)} found)", df, positions)
+
+def render_results(df: pd.DataFrame, positions: np.ndarray) -> StreamingResponse:
+    return StreamingResponse(execution.iterate(results_page(df, positions), rows_lane(len(positions))),
+                             media_type="text/html; charset=utf-8")
+
+def search_page(data, key: tuple, find: Callable[[], np.ndarray]) -> Response:
+    """Results page for a search: from the page cache when this (normalised)
+    query was rendered before, else ``find()`` the positions and render."""
+    key = query_key(*key)
+    page = pages.get(key, data.generation)
+    if page is None:
+        positions = find()
+        if len(positions) > PAGE_CACHE_ROWS:
+            return render_results(data.df, positions)
+        page = "".join(results_page(data.df, positions)).encode()
+        pages.put(key, data.generation, page, len(page))
+    return Response(page, media_type="text/html; charset=utf-8")
 
 # ----------------- SEARCH ROUTES -----------------
 @app.get("/search-date", response_class=HTMLResponse)
-def get_by_date(date: str):
-    results = df[df["date"].str.contains(date.strip(), case=False, na=False) |
-                 df["date_iso"].str.contains(date.strip(), case=False, na=False)]
-    return render_results(results)
+@in_lane("fast")
+def get_by_date(request: Request,
+                date: str = "",
+                from_date: Optional[str] = Query(None, alias="from"),
+                to_date: Optional[str] = Query(None, alias="to")):
+    data = snapshot(request)
+    try:
+        return search_page(data, ("date", date, from_date, to_date),
+                           lambda: search.by_date(data, date, from_date, to_date))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
 
 @app.get("/search-amount", response_class=HTMLResponse)
-def get_by_amount(amount: str):
-    amount = amount.replace(",", "").strip()
-    results = df[(df["debit"].str.contains(amount, na=False)) |
-                 (df["credit"].str.contains(amount, na=False))]
-    return render_results(results)
+@in_lane(lambda mode="exact", **_: "slow" if mode == "fuzzy" else "fast")  # fuzzy scans every row
+def get_by_amount(request: Request, amount: str = "", mode: str = "exact",
+                  min_amount: Optional[str] = Query(None, alias="min"),
+                  max_amount: Optional[str] = Query(None, alias="max"),
+                  tolerance: Optional[str] = None):
+    data = snapshot(request)
+    if mode == "fuzzy":
+        return search_page(data, ("amount-text", amount), lambda: search.by_amount_text(data, amount))
+    if mode != "exact":
+        raise HTTPException(status_code=400, detail="mode must be 'exact' or 'fuzzy'")
+    try:
+        return search_page(data, ("amount", amount, min_amount, max_amount, tolerance),
+                           lambda: search.by_amount(data, amount, min_amount, max_amount, tolerance))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
 
 @app.get("/search-id", response_class=HTMLResponse)
-def get_by_id(id: str):
-    id = id.strip()
-    results = df[df["id"].str.contains(id, na=False)]
-    return render_results(results)
+@in_lane(lambda edits=0, **_: "slow" if edits else "fast")  # short IDs with edits scan every ID
+def get_by_id(request: Request, id: str, edits: int = 0):
+    data = snapshot(request)
+    try:
+        return search_page(data, ("id", id, edits), lambda: search.by_id(data, id, edits))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+
+@app.get("/search-description", response_class=HTMLResponse)
+@in_lane(lambda mode="words", **_: "slow" if mode == "substring" else "fast")
+def get_by_description(request: Request, q: str, prefix: bool = False, mode: str = "words"):
+    data = snapshot(request)
+    try:
+        return search_page(data, ("description", q, prefix, mode),
+                           lambda: search.by_description(data, q, prefix, mode))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+
+# ----------------- ADMIN -----------------
+def _is_loopback(host: Optional[str]) -> bool:
+    try:
+        return host is not None and ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def _check_admin(request: Request, token: Optional[str]) -> None:
+    if ADMIN_TOKEN:
+        if token != ADMIN_TOKEN:
+            raise HTTPException(status_code=403, detail="bad or missing X-Admin-Token")
+    elif not _is_loopback(request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="set ADMIN_TOKEN to allow admin requests from other hosts")
+
+@app.get("/admin/status")
+def admin_status(request: Request, x_admin_token: Optional[str] = Header(None)):
+    _check_admin(request, x_admin_token)
+    data = live.current
+    return {
+        **live.progress(),
+        "version": data.version if data else None,
+        "loaded_at": data.loaded_at if data else None,
+        "reloads": live.reloads,
+        "reloading": live.reloading,
+        "cache": {"positions": search.POSITIONS.stats(), "pages": pages.stats()},
+        "lanes": {name: lane.stats() for name, lane in execution.LANES.items()},
+    }
+
+@app.post("/admin/reload", status_code=202)
+def admin_reload(request: Request, force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """Rebuild the dataset in the background; searches keep being served
+    from the old snapshot until the new one is swapped in."""
+    _check_admin(request, x_admin_token)
+    started = live.reload_in_background(force=force)
+    return {"started": started, "reloading": live.reloading,
+            "version": live.current.version if live.ready else None}
 
 # ----------------- RUN SERVER -----------------
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    parser = argparse.ArgumentParser(description="Serve the transaction search")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="worker processes; they share one copy of the data (default: 1)")
+    args = parser.parse_args()
+    if args.workers > 1:
+        # The workers import main afresh and read this to know they're sharing
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
 
 
 
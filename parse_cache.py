@@ -0,0 +1,109 @@
+# parse_cache.py
+"""On-disk cache that lets a parse skip work it has already done.
+
+* A manifest remembers, per PDF, the content hash and parser version of the
+  last successful parse and the output it produced. If both still match,
+  the parse is skipped without opening the PDF at all.
+* Extracted page text is stored by a hash of the page's content streams, so
+  a statement with pages appended (or a re-issued copy) only extracts the
+  pages that are actually new.
+"""
+import hashlib
+import json
+import os
+from typing import Optional
+
+from pdfminer.pdftypes import resolve1
+
+CACHE_DIR = ".parse_cache"
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def page_digest(page, salt: str = "") -> str:
+    """Hash of a pdfplumber page's raw content streams (no text extraction)."""
+    h = hashlib.sha256(salt.encode())
+    for stream in page.page_obj.contents:
+        h.update(resolve1(stream).get_data())
+    return h.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.pages_dir = os.path.join(cache_dir, "pages")
+        self.manifest_file = os.path.join(cache_dir, "manifest.json")
+        os.makedirs(self.pages_dir, exist_ok=True)
+
+    # ----------------- MANIFEST -----------------
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest: dict) -> None:
+        tmp = self.manifest_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, self.manifest_file)
+
+    def is_fresh(self, pdf_file: str, output: str, sha256: str, version: str) -> bool:
+        """True if ``output`` was built from exactly this PDF by this parser version."""
+        entry = self._load_manifest().get(os.path.abspath(pdf_file))
+        return (
+            entry is not None
+            and entry.get("sha256") == sha256
+            and entry.get("parser_version") == version
+            and entry.get("output") == os.path.abspath(output)
+            and os.path.exists(output)
+        )
+
+    def ingested_pages(self, pdf_file: str, output: str, version: str) -> list[str]:
+        """Page digests recorded the last time this PDF was ingested into ``output``."""
+        entry = self._load_manifest().get(os.path.abspath(pdf_file))
+        if (entry is None or entry.get("parser_version") != version
+                or entry.get("output") != os.path.abspath(output)):
+            return []
+        return entry.get("pages", [])
+
+    def sources(self, output: str) -> list[str]:
+        """Every PDF recorded as ingested into ``output``."""
+        output = os.path.abspath(output)
+        return [pdf for pdf, entry in self._load_manifest().items() if entry.get("output") == output]
+
+    def record(self, pdf_file: str, output: str, sha256: str, version: str,
+               pages: Optional[list[str]] = None) -> None:
+        manifest = self._load_manifest()
+        manifest[os.path.abspath(pdf_file)] = {
+            "sha256": sha256,
+            "parser_version": version,
+            "output": os.path.abspath(output),
+            "pages": pages or [],
+        }
+        self._save_manifest(manifest)
+
+    # ----------------- PAGE TEXT -----------------
+    def _page_path(self, digest: str) -> str:
+        return os.path.join(self.pages_dir, digest + ".txt")
+
+    def get_page(self, digest: str) -> Optional[str]:
+        try:
+            with open(self._page_path(digest), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put_page(self, digest: str, text: str) -> None:
+        path = self._page_path(digest)
+        tmp = f"{path}.{os.getpid()}.tmp"  # parse workers may race on a shared page
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
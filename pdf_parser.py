@@ -1,23 +1,83 @@
 # pdf_parser.py
 import re
-import sys
+import argparse
+import functools
+import glob
+import time
 import pdfplumber
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import repeat
+from typing import Iterable, Optional, Sequence
 import os
+from balances import read_for_check, summary, verify_balances
+from colstore import STORE_DIR, drop_store, read_store, store_attrs, store_exists, store_rows
+from dataset import add_typed_columns
+from layout import COLUMN_SEP, FIELDS, LEARN_PAGES, Columns
+from ledger import upsert
+from parse_cache import CACHE_DIR, ParseCache, file_digest, page_digest
+from shared import store_lock
 
 DATE_RX = re.compile(r"^\s*(\d{2}\s+[A-Z]{3}\s+\d{2})\b")
-AMOUNT_RX = re.compile(r"-?\d{1,3}(?:,\d{3})*\.\d{2}")
+# The dates and amounts inside a record, in one left-to-right pass. An amount
+# can't start mid-number, so '1234.56' is one amount (not '234.56').
+TOKEN_RX = re.compile(r"""(?a)
+    (?P<date>\b\d{2}\s+[A-Z]{3}\s+\d{2}\b)
+  | (?P<amount>(?<![\d,])-?(?:\d{1,3}(?:,\d{3})+|\d+)\.\d{2})
+""", re.X)
 ID_RX = re.compile(r"\b(\d{8,18})\b")  # picks up IDs like 19828166 or 200515912587008
+ACCOUNT_RX = re.compile(r"\bACCOUNT\s*(?:NO|NUMBER|#)?\.?\s*:?\s*(\d[\d-]{5,}\d)")
+
+# Bump PARSER_VERSION whenever record parsing changes so cached datasets are
+# rebuilt; bump EXTRACT_VERSION when EXTRACT_SETTINGS change the page text.
+PARSER_VERSION = "6"
+EXTRACT_VERSION = "1"
+EXTRACT_SETTINGS = {"x_tolerance": 1, "y_tolerance": 1}
+LAYOUT_TAG = "+layout"  # parser version suffix of stores parsed by column layout
+PAGE_RECORDS = 1 << 20  # a record's number is page * PAGE_RECORDS + its place on the page
+
+# ----------------- LINE CLASSIFIER -----------------
+# What each line of page text is, from where things sit on it, in one match:
+# the date that opens a transaction, page furniture that must take up the
+# whole line ('PAGE 3', the column headings) or start it ('OPENING BALANCE',
+# 'ACCOUNT NO:'). Words like CREDIT or PAGE inside a narration don't count.
+HEADER, FOOTER, START, CONTINUATION = "header", "footer", "start", "continuation"
+_HEADINGS = r"(?:VALUE\s+DATE|DATE|DESCRIPTION|NARRATION|PARTICULARS|REF(?:ERENCE)?\s+NO\.?|DEBIT|CREDIT|BALANCE)"
+LINE_RX = re.compile(r"""
+    (?P<header>(?i:
+        (?:\d{2}\s+[A-Z]{3}\s+\d{2}\s+)?OPENING\s+BALANCE\b
+      | ACCOUNT\s+STATEMENT\b | STATEMENT\s+OF\s+ACCOUNTS?\b
+      | ACCOUNT\s*(?:NUMBER|NO\b|\#)
+      | HEADINGS(?:\s+HEADINGS)+\s*$
+    ))
+  | (?P<footer>(?i:
+        (?:\d{2}\s+[A-Z]{3}\s+\d{2}\s+)?CLOSING\s+BALANCE\b
+      | PAGE\s+\d+(?:\s*(?:OF|/)\s*\d+)?\s*$
+      | (?:PAGE\s+)?TOTALS?\s*:?(?:\s*-?[\d,]+\.\d{2})*\s*$
+      | [*\s]*END\s+OF\s+STATEMENT\b
+    ))
+  | (?P<start>(?P<date>\d{2}\s+[A-Z]{3}\s+\d{2})\b)
+""".replace("HEADINGS", _HEADINGS), re.X)
+
+
+def classify_line(line: str) -> tuple[str, Optional[str]]:
+    """(kind, date) of a cleaned, non-blank line; ``date`` is only set for START."""
+    m = LINE_RX.match(line)
+    if m is None:
+        return CONTINUATION, None
+    return m.lastgroup, m.group("date")
+
+
+RECORD_COLUMNS = ["date", "date_iso", "description", "id", "value_date", "debit", "credit", "balance", "raw"]
+COLUMNS = RECORD_COLUMNS + ["source", "account"]
 
 def _norm_amount(s: str) -> str:
     """Normalize amount string: remove commas, keep sign, keep 2 decimals as string."""
-    s = s.strip()
-    s = s.replace(",", "")
-    if not re.fullmatch(r"-?\d+(\.\d{2})", s):
-        return s
-    return s
+    return s.strip().replace(",", "")
 
+@functools.lru_cache(maxsize=4096)  # a statement repeats a few hundred dates
 def _to_iso(date_txt: str) -> str:
     """Convert '02 JUL 24' -> '2024-07-02' (assumes 20xx)."""
     date_txt = date_txt.strip().upper()
@@ -30,74 +90,196 @@ def _to_iso(date_txt: str) -> str:
 def _clean_line(line: str) -> str:
     return " ".join(line.split())
 
-def parse_pdf_to_rows(pdf_file: str) -> list[dict]:
+def _extract_page_texts(pdf_file: str, pages: list[int], columns: Optional[Columns] = None) -> list[str]:
+    """Extract the text of the given page numbers, laid out by ``columns``
+    when given. Runs inside pool workers."""
+    texts = []
+    with pdfplumber.open(pdf_file) as pdf:
+        for i in pages:
+            page = pdf.pages[i]
+            if columns:
+                texts.append(columns.page_text(page.extract_words(**EXTRACT_SETTINGS)))
+            else:
+                texts.append(page.extract_text(**EXTRACT_SETTINGS) or "")
+            page.close()  # drop pdfplumber's per-page object cache
+    return texts
+
+def _extract_parallel(pdf_file: str, pages: list[int], workers: int,
+                      columns: Optional[Columns] = None) -> list[str]:
+    """Extract pages in a process pool and return their texts in order."""
+    # A few shards per worker so one slow range doesn't leave the rest idle
+    size = max(1, -(-len(pages) // (workers * 4)))
+    shards = [pages[i:i + size] for i in range(0, len(pages), size)]
+    texts = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields in submission order, so pages come back in order
+        for chunk in pool.map(_extract_page_texts, repeat(pdf_file), shards, repeat(columns)):
+            texts.extend(chunk)
+    return texts
+
+def _rows_from_texts(texts: Iterable[str], first_page: int = 0) -> list[dict]:
+    """Stitch page texts into records. Pages are fed in order through one
+    state machine, so a record that wraps onto the next page still joins.
+
+    Each row's ``record`` numbers it in statement order from the page it
+    starts on, so it doesn't depend on which page parsing started at.
+    """
     rows = []
     current = None
 
-    with pdfplumber.open(pdf_file) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text(x_tolerance=1, y_tolerance=1) or ""
-            for raw_line in text.split("\n"):
-                line = _clean_line(raw_line)
-
-                if not line or any(h in line.upper() for h in [
-                    "DATE", "DESCRIPTION", "VALUE DATE", "DEBIT", "CREDIT", "BALANCE",
-                    "ACCOUNT", "STATEMENT", "PAGE", "OPENING BALANCE", "CLOSING BALANCE"
-                ]):
-                    continue
-
-                m_date = DATE_RX.match(line)
-                if m_date:
-                    if current:
-                        rows.append(_parse_record(current))
-                    current = {
-                        "date_txt": m_date.group(1).strip(),
-                        "raw": line
-                    }
-                else:
-                    if current:
-                        current["raw"] += " " + line
-
-        if current:
-            rows.append(_parse_record(current))
+    for page, text in enumerate(texts, start=first_page):
+        record = page * PAGE_RECORDS
+        for raw_line in text.split("\n"):
+            # Layout extraction appends the column fields (see layout.py)
+            line, *columns = raw_line.split(COLUMN_SEP)
+            line = _clean_line(line)
+            if not line and not any(columns):
+                continue
+            raw = " ".join([line] + [c for c in columns if c]).strip()
+
+            kind, date_txt = classify_line(line) if line else (CONTINUATION, None)
+            if kind == START:
+                if current:
+                    rows.append({**_parse_record(current), "record": current["record"]})
+                current = {
+                    "date_txt": date_txt,
+                    "raw": raw,
+                    "record": record
+                }
+                record += 1
+                if columns:
+                    current["text"], current["columns"] = line, columns
+            elif kind == CONTINUATION:
+                if current:
+                    if columns or "columns" in current:
+                        # Lines so far had no column fields, so their raw text is all narrative
+                        current.setdefault("text", current["raw"])
+                        current["text"] += " " + line
+                        # A field wrapped onto this line fills a blank one
+                        blank = [""] * len(FIELDS)
+                        current["columns"] = [a or b for a, b in zip(current.get("columns", blank), columns or blank)]
+                    current["raw"] += " " + raw
+
+    if current:
+        rows.append({**_parse_record(current), "record": current["record"]})
 
     rows = [r for r in rows if r.get("date") or r.get("description")]
     return rows
 
+def learn_columns(pdf) -> Optional[Columns]:
+    """The column layout of an open statement, from its first pages."""
+    pages = pdf.pages[:LEARN_PAGES]
+    columns = Columns.learn(p.extract_words(**EXTRACT_SETTINGS) for p in pages)
+    for p in pages:
+        p.close()
+    return columns
+
+def extract_pages(pdf_file: str, workers: int = 1, cache: Optional[ParseCache] = None,
+                  ingested: Sequence[str] = (), layout: bool = False) -> tuple[list[str], list[str]]:
+    """Text of the pages that still need parsing, and the digest of every page.
+
+    ``ingested`` holds the page digests of the last ingestion of this PDF.
+    Leading pages that are unchanged since then are skipped, except the last
+    one: it is parsed again so a record wrapping onto the first new page
+    still joins (the ledger drops the rows it has already seen).
+
+    With ``layout``, words are put in the columns learned from the first
+    pages (see layout.py); plain text is extracted if none can be learned.
+    """
+    t0 = time.perf_counter()
+    with pdfplumber.open(pdf_file) as pdf:
+        n_pages = len(pdf.pages)
+        columns = learn_columns(pdf) if layout else None
+        if layout and columns is None:
+            print(f"⚠️ No debit/credit/balance columns found in {pdf_file}; reading it as plain text")
+        salt = f"{EXTRACT_VERSION}:{columns.key}" if columns else EXTRACT_VERSION
+        digests = [page_digest(p, salt=salt) for p in pdf.pages] if cache else []
+
+    unchanged = 0
+    for old, new in zip(ingested, digests):
+        if old != new:
+            break
+        unchanged += 1
+    pages = list(range(max(unchanged - 1, 0), n_pages))
+
+    # Reuse text of pages we've already extracted, extract only the rest
+    texts = {i: cache.get_page(digests[i]) if cache else None for i in pages}
+    missing = [i for i in pages if texts[i] is None]
+
+    workers = max(1, min(workers, len(missing)))
+    if workers > 1:
+        extracted = _extract_parallel(pdf_file, missing, workers, columns)
+    elif missing:
+        extracted = _extract_page_texts(pdf_file, missing, columns)
+    else:
+        extracted = []
+    for i, text in zip(missing, extracted):
+        texts[i] = text
+        if cache:
+            cache.put_page(digests[i], text)
+
+    elapsed = time.perf_counter() - t0
+    cached = f", {len(pages) - len(missing)} from cache" if cache else ""
+    skipped = f", {n_pages - len(pages)} already ingested" if len(pages) < n_pages else ""
+    mode = " by column layout" if columns else ""
+    print(f"📄 Extracted {len(missing)} pages{mode} in {elapsed:.1f}s "
+          f"({len(missing) / max(elapsed, 1e-9):.1f} pages/s, "
+          f"{workers} worker{'s' if workers > 1 else ''}{cached}{skipped})")
+
+    return [texts[i] for i in pages], digests
+
+def parse_pdf_to_rows(pdf_file: str, workers: int = 1, cache: Optional[ParseCache] = None,
+                      layout: bool = False) -> list[dict]:
+    texts, _ = extract_pages(pdf_file, workers=workers, cache=cache, layout=layout)
+    return _rows_from_texts(texts)
+
 def _parse_record(block: dict) -> dict:
+    """Split a record's text by the spans the patterns match in it: the
+    leading date, the last three amounts (debit, credit, balance) and the
+    value date. The description is whatever lies between them.
+
+    Records read by column layout bring their value date and amounts in
+    ``columns``; only a missing value date is still looked for in the text.
+    """
     raw = block.get("raw", "").strip()
+    text = block.get("text", raw).strip()
 
     date_txt = block.get("date_txt", "").strip()
     date_iso = _to_iso(date_txt)
 
-    amounts = AMOUNT_RX.findall(raw)
-    debit = credit = balance = ""
-    if len(amounts) >= 3:
-        debit, credit, balance = amounts[-3], amounts[-2], amounts[-1]
-        debit, credit, balance = _norm_amount(debit), _norm_amount(credit), _norm_amount(balance)
+    m_date = DATE_RX.match(text)
+    start = m_date.end() if m_date else 0
 
-        tmp = raw
-        for a in [balance, credit, debit]:
-            tmp = tmp[::-1].replace(a[::-1], "", 1)[::-1]
-        stripped = tmp.strip()
+    cuts = []
+    debit = credit = balance = value_date = ""
+    if "columns" in block:
+        value_date, debit, credit, balance = block["columns"]
+        debit, credit, balance = _norm_amount(debit), _norm_amount(credit), _norm_amount(balance)
+        tokens = [] if value_date else list(TOKEN_RX.finditer(text, start))
     else:
-        stripped = raw
-
-    desc_part = DATE_RX.sub("", stripped, count=1).strip()
-
-    value_date = ""
-    other_dates = re.findall(r"\b\d{2}\s+[A-Z]{3}\s+\d{2}\b", desc_part)
-    if other_dates:
-        value_date = other_dates[-1]
-        desc_part = re.sub(r"\b" + re.escape(value_date) + r"\b", "", desc_part).strip()
+        tokens = list(TOKEN_RX.finditer(text, start))
+        amounts = [m for m in tokens if m.lastgroup == "amount"]
+        if len(amounts) >= 3:
+            debit, credit, balance = (_norm_amount(m.group()) for m in amounts[-3:])
+            cuts = [m.span() for m in amounts[-3:]]
+
+    dates = [m for m in tokens if m.lastgroup == "date"]
+    if dates:
+        value_date = dates[-1].group()
+        cuts += [m.span() for m in dates if m.group() == value_date]
+
+    pieces, at = [], start
+    for a, b in sorted(cuts):
+        pieces.append(text[at:a])
+        at = b
+    pieces.append(text[at:])
+    description = _clean_line(" ".join(pieces))
 
     trans_id = ""
-    m_id = ID_RX.search(desc_part)
+    m_id = ID_RX.search(description)
     if m_id:
         trans_id = m_id.group(1)
 
-    description = _clean_line(desc_part)
-
     return {
         "date": date_txt,
         "date_iso": date_iso,
@@ -110,37 +292,200 @@ def _parse_record(block: dict) -> dict:
         "raw": raw
     }
 
-def parse_pdf_to_csv(pdf_file: str = "STMT.ENT.BOOK1.pdf", csv_file: str = "transactions.csv") -> str:
-    rows = parse_pdf_to_rows(pdf_file)
-    new_df = pd.DataFrame(rows, columns=[
-        "date", "date_iso", "description", "id", "value_date", "debit", "credit", "balance", "raw"
-    ]).fillna("")
-
-    for col in new_df.columns:
-        new_df[col] = new_df[col].astype(str).str.strip()
-
-    if os.path.exists(csv_file):
-        old_df = pd.read_csv(csv_file, dtype=str).fillna("")
-        existing_rows = len(old_df)
-
-        # Only keep new rows
-        new_rows = new_df.iloc[existing_rows:]
-        if new_rows.empty:
-            print("✅ No new rows found. Already up-to-date.")
-        else:
-            new_rows.to_csv(csv_file, mode="a", header=False, index=False)
-            print(f"✅ Added {len(new_rows)} new rows -> {csv_file} (now {existing_rows+len(new_rows)} total)")
+def export_csv(store_dir: str, csv_file: str) -> str:
+    """Write the text columns of a store out as a plain transactions.csv."""
+    read_store(store_dir, columns=COLUMNS).to_csv(csv_file, index=False)
+    print(f"✅ Exported {store_rows(store_dir)} rows -> {csv_file}")
+    return csv_file
+
+# ----------------- INGESTION -----------------
+def expand_sources(pattern: str) -> list[str]:
+    """A PDF path, a directory of PDFs or a glob -> sorted list of PDFs."""
+    if os.path.isdir(pattern):
+        return sorted(os.path.join(pattern, f) for f in os.listdir(pattern) if f.lower().endswith(".pdf"))
+    if os.path.isfile(pattern):
+        return [pattern]
+    return sorted(glob.glob(pattern))
+
+def _find_account(text: str) -> str:
+    m = ACCOUNT_RX.search(text.upper())
+    return m.group(1) if m else ""
+
+def _parser_version(layout: bool) -> str:
+    return PARSER_VERSION + LAYOUT_TAG if layout else PARSER_VERSION
+
+def _parse_statement(pdf_file: str, store_dir: str, workers: int, cache_dir: Optional[str],
+                     force: bool, layout: bool = False) -> Optional[dict]:
+    """Parse one statement, or None if it is unchanged since it was ingested.
+    Runs inside pool workers when several statements are ingested at once."""
+    cache = ParseCache(cache_dir) if cache_dir else None
+    sha256 = file_digest(pdf_file) if cache else ""
+    known = cache and store_exists(store_dir) and not force
+    if known and cache.is_fresh(pdf_file, store_dir, sha256, _parser_version(layout)):
+        return None
+
+    # Only pages changed since this PDF was last ingested need parsing
+    ingested = cache.ingested_pages(pdf_file, store_dir, _parser_version(layout)) if known else []
+    texts, digests = extract_pages(pdf_file, workers=workers, cache=cache, ingested=ingested, layout=layout)
+
+    # The account number is printed in the first page's header. Without one
+    # it stays blank: it's part of each row's fingerprint, so it mustn't
+    # depend on the file name (a renamed copy would be stored again)
+    if cache and len(texts) < len(digests):
+        first_page = cache.get_page(digests[0]) or ""
     else:
-        new_df.to_csv(csv_file, index=False)
-        print(f"✅ Created {csv_file} with {len(new_df)} rows")
+        first_page = texts[0] if texts else ""
+    account = _find_account(first_page)
+    rows = _rows_from_texts(texts, first_page=len(digests) - len(texts) if digests else 0)
+    return {"rows": rows, "account": account, "sha256": sha256, "pages": digests}
+
+def _rows_frame(rows: list[dict], source: str, account: str) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=RECORD_COLUMNS).fillna("")
+    for col in df.columns:
+        df[col] = df[col].astype(str).str.strip()
+    df["source"] = source
+    df["account"] = account
+    # Statement order, which date order loses (see balances.verify_balances)
+    df["record"] = np.array([r["record"] for r in rows], dtype=np.int64)
+    return add_typed_columns(df)
+
+def ingest(sources: list[str], store_dir: str = STORE_DIR, workers: int = 1,
+           cache_dir: Optional[str] = CACHE_DIR, layout: Optional[bool] = None) -> int:
+    """Parse statement PDFs concurrently and merge them into the store.
+
+    Statements are upserted one by one, earliest first, so overlapping
+    statements don't duplicate rows. Each write holds the store lock, so the
+    watcher and the server can ingest into the same store. ``layout`` reads
+    them by column layout (see extract_pages); None keeps the mode the store
+    was built with. Returns the number of rows added.
+    """
+    if not sources:
+        print("⚠️ No statement PDFs to ingest")
+        return 0
+
+    if layout is None:
+        layout = store_attrs(store_dir).get("parser_version", "").endswith(LAYOUT_TAG)
+    version = _parser_version(layout)
+    cache = ParseCache(cache_dir) if cache_dir else None
+    force = set()
+    with store_lock(store_dir):
+        if store_exists(store_dir) and store_attrs(store_dir).get("parser_version") != version:
+            # Rows were parsed by another parser version: rebuild the whole store
+            # (page text comes from the cache, so this costs no PDF extraction)
+            print(f"🔁 {store_dir} was built by another parser version. Rebuilding it")
+            drop_store(store_dir)
+            previous = [p for p in (cache.sources(store_dir) if cache else []) if os.path.exists(p)]
+            sources = previous + [s for s in sources if os.path.abspath(s) not in previous]
+            force = set(sources)
+
+    args = [(pdf, store_dir, 1 if len(sources) > 1 else workers, cache_dir, pdf in force, layout)
+            for pdf in sources]
+    if len(sources) > 1 and workers > 1:
+        # One statement per process; results still come back in ``sources`` order
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(sources)))
+        results = pool.map(_parse_statement, *zip(*args))
+    else:
+        pool = None
+        results = (_parse_statement(*a) for a in args)
 
+    total = 0
+    try:
+        parsed = []
+        for pdf_file, result in zip(sources, results):
+            if result is None:
+                print(f"✅ {pdf_file} unchanged since last parse")
+                continue
+            df = _rows_frame(result["rows"], os.path.basename(pdf_file), result["account"])
+            parsed.append((pdf_file, result, df))
+
+        # Earliest statements first, so later ones mostly append instead of
+        # rewriting the rows they're dated before
+        parsed.sort(key=lambda p: p[2]["date_dt"].min() if p[2]["date_dt"].notna().any() else pd.Timestamp.max)
+        for pdf_file, result, df in parsed:
+            # The ledger keeps only transactions the store doesn't already hold
+            with store_lock(store_dir):
+                created = not store_exists(store_dir)
+                added, skipped = upsert(store_dir, df, attrs={"parser_version": version})
+                rows = store_rows(store_dir)
+                if cache:
+                    cache.record(pdf_file, store_dir, result["sha256"], version, pages=result["pages"])
+            total += added
+            if created:
+                print(f"✅ Created {store_dir} with {added} rows from {pdf_file}")
+            elif added:
+                print(f"✅ Added {added} new rows from {pdf_file} -> {store_dir} "
+                      f"(now {rows} total, {skipped} already present)")
+            else:
+                print(f"✅ No new rows in {pdf_file}. Already up-to-date.")
+    finally:
+        if pool:
+            pool.shutdown()
+    if total:
+        # Mis-split records show up as breaks in the running balance
+        print(summary(verify_balances(read_for_check(store_dir))))
+    return total
+
+def watch(pattern: str, store_dir: str = STORE_DIR, interval: float = 30.0, workers: int = 1,
+          cache_dir: Optional[str] = CACHE_DIR, layout: Optional[bool] = None) -> None:
+    """Poll ``pattern`` and ingest statements as they land or change."""
+    seen = {}
+    print(f"👀 Watching {pattern} every {interval:g}s (Ctrl+C to stop)")
+    while True:
+        changed = []
+        for pdf_file in expand_sources(pattern):
+            st = os.stat(pdf_file)
+            if seen.get(pdf_file) != (st.st_size, st.st_mtime):
+                seen[pdf_file] = (st.st_size, st.st_mtime)
+                changed.append(pdf_file)
+        if changed:
+            try:
+                ingest(changed, store_dir, workers=workers, cache_dir=cache_dir, layout=layout)
+            except Exception as e:  # e.g. a PDF still being copied in
+                print(f"⚠️ Ingest failed, will retry: {e}")
+                for pdf_file in changed:
+                    seen.pop(pdf_file, None)
+        time.sleep(interval)
+
+def parse_pdf_to_dataset(pdf_file: str = "STMT.ENT.BOOK1.pdf", store_dir: str = STORE_DIR,
+                         csv_file: Optional[str] = None, workers: int = 1,
+                         cache_dir: Optional[str] = CACHE_DIR, layout: Optional[bool] = None) -> str:
+    """Parse statements (a PDF, a directory or a glob) into the columnar
+    store, and optionally export a CSV copy."""
+    added = ingest(expand_sources(pdf_file), store_dir, workers=workers, cache_dir=cache_dir, layout=layout)
+    if csv_file and (added or not os.path.exists(csv_file)):
+        export_csv(store_dir, csv_file)
+    return store_dir
+
+def parse_pdf_to_csv(pdf_file: str = "STMT.ENT.BOOK1.pdf", csv_file: str = "transactions.csv",
+                     workers: int = 1, cache_dir: Optional[str] = CACHE_DIR) -> str:
+    parse_pdf_to_dataset(pdf_file, STORE_DIR, csv_file=csv_file, workers=workers, cache_dir=cache_dir)
     return csv_file
 
 if __name__ == "__main__":
-    pdf = sys.argv[1] if len(sys.argv) > 1 else "STMT.ENT.BOOK1.pdf"
-    csv = sys.argv[2] if len(sys.argv) > 2 else "transactions.csv"
-    parse_pdf_to_csv(pdf, csv)
-
+    parser = argparse.ArgumentParser(description="Parse bank statement PDFs into the transactions store")
+    parser.add_argument("pdf", nargs="?", default="STMT.ENT.BOOK1.pdf",
+                        help="a statement PDF, a directory of PDFs or a glob like 'statements/*.pdf'")
+    parser.add_argument("csv", nargs="?", default=None, help="also export the rows to this CSV file")
+    parser.add_argument("--store", default=STORE_DIR, help=f"columnar store directory (default: {STORE_DIR})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used for parsing: per statement when ingesting several, "
+                             "per page range for a single one (default: 1)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help=f"parse cache location (default: {CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="always re-extract every page")
+    parser.add_argument("--watch", action="store_true", help="keep polling for new statements")
+    parser.add_argument("--interval", type=float, default=30.0, help="--watch polling interval in seconds")
+    parser.add_argument("--layout", action=argparse.BooleanOptionalAction, default=None,
+                        help="read amounts by column position rather than their order on the line "
+                             "(default: however the store was built)")
+    args = parser.parse_args()
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.watch:
+        watch(args.pdf, args.store, interval=args.interval, workers=args.workers, cache_dir=cache_dir,
+              layout=args.layout)
+    else:
+        parse_pdf_to_dataset(args.pdf, args.store, csv_file=args.csv, workers=args.workers,
+                             cache_dir=cache_dir, layout=args.layout)
 
 
 
@@ -0,0 +1,203 @@
+# planner.py
+"""Multi-predicate queries over a Dataset.
+
+A query is a list of predicates that must all hold. The planner asks every
+indexed predicate how many rows it would return (a couple of binary
+searches, no rows touched), looks up the most selective one, then for each
+remaining predicate either intersects with its index lookup or checks it
+row-by-row on the surviving candidates, whichever is cheaper. Predicates
+with no index would always be checked on candidates; if nothing is indexed
+the whole dataset is scanned.
+"""
+import time
+from typing import Optional
+
+import numpy as np
+
+from dataset import NO_AMOUNT, Dataset
+from indexes import EMPTY, query_groups
+
+
+# ----------------- PREDICATES -----------------
+class Predicate:
+    # Relative cost of checking one candidate row, vs one numeric compare
+    weight = 1.0
+
+    def estimate(self, data: Dataset) -> Optional[int]:
+        """Rows an index lookup would return, or None if there's no index."""
+        return None
+
+    def lookup(self, data: Dataset) -> np.ndarray:
+        raise NotImplementedError
+
+    def check(self, data: Dataset, positions: np.ndarray) -> np.ndarray:
+        """Boolean mask: which of ``positions`` satisfy the predicate."""
+        raise NotImplementedError
+
+
+class DateRange(Predicate):
+    def __init__(self, lo=None, hi=None):
+        self.lo, self.hi = lo, hi
+
+    def __str__(self):
+        return f"date between {self.lo or '-inf'} and {self.hi or '+inf'}"
+
+    def estimate(self, data):
+        start, stop = data.dates.span(self.lo, self.hi)
+        return max(stop - start, 0)
+
+    def lookup(self, data):
+        return data.dates.between(self.lo, self.hi)
+
+    def check(self, data, positions):
+        days = data.df["date_dt"].to_numpy()[positions].astype("datetime64[D]")
+        ok = ~np.isnat(days)
+        if self.lo is not None:
+            ok &= days >= np.datetime64(self.lo, "D")
+        if self.hi is not None:
+            ok &= days <= np.datetime64(self.hi, "D")
+        return ok
+
+
+class DateText(Predicate):
+    weight = 20.0
+
+    def __init__(self, text: str):
+        self.text = text
+        self._hits = None
+
+    def __str__(self):
+        return f"date text contains {self.text!r}"
+
+    def estimate(self, data):
+        # Matching only scans the per-day labels, so just do it
+        return len(self.lookup(data))
+
+    def lookup(self, data):
+        if self._hits is None:
+            self._hits = data.dates.matching(self.text)
+        return self._hits
+
+    def check(self, data, positions):
+        return np.isin(positions, self.lookup(data))
+
+
+class AmountRange(Predicate):
+    """Magnitude within [lo, hi] cents, on ``column`` or on debit or credit."""
+
+    def __init__(self, lo: Optional[int] = None, hi: Optional[int] = None, column: Optional[str] = None):
+        self.lo, self.hi, self.column = lo, hi, column
+
+    def __str__(self):
+        what = self.column or "amount"
+        return f"{what} between {self.lo if self.lo is not None else '-inf'} and " \
+               f"{self.hi if self.hi is not None else '+inf'} cents"
+
+    def estimate(self, data):
+        return data.amounts.count_between(self.lo, self.hi)
+
+    def lookup(self, data):
+        positions = data.amounts.between(self.lo, self.hi)
+        if self.column is None:
+            return positions
+        # The index covers debit and credit together; keep this column's hits
+        return positions[self.check(data, positions)]
+
+    def check(self, data, positions):
+        columns = [self.column] if self.column else ["debit", "credit"]
+        ok = np.zeros(len(positions), dtype=bool)
+        for col in columns:
+            cents = data.df[f"{col}_cents"].to_numpy()[positions]
+            hit = cents != NO_AMOUNT
+            cents = np.abs(cents)
+            if self.lo is not None:
+                hit &= cents >= self.lo
+            if self.hi is not None:
+                hit &= cents <= self.hi
+            ok |= hit
+        return ok
+
+
+class IdPrefix(Predicate):
+    weight = 8.0
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+
+    def __str__(self):
+        return f"id starts with {self.prefix!r}"
+
+    def estimate(self, data):
+        return data.ids.count_prefix(self.prefix)
+
+    def lookup(self, data):
+        return data.ids.prefix(self.prefix)
+
+    def check(self, data, positions):
+        ids = data.df["id"].array[positions].to_numpy().astype(str)
+        return np.char.startswith(ids, self.prefix)
+
+
+class DescriptionMatch(Predicate):
+    """Token query over descriptions (see indexes.query_groups)."""
+    weight = 2.0
+
+    def __init__(self, query: str, prefix: bool = False):
+        self.query = query
+        self.groups = query_groups(query, prefix)
+        self._hits = None
+
+    def __str__(self):
+        return f"description matches {self.query!r}"
+
+    def estimate(self, data):
+        return data.text.estimate(self.groups)
+
+    def lookup(self, data):
+        if self._hits is None:
+            self._hits = data.text.match(self.groups)
+        return self._hits
+
+    def check(self, data, positions):
+        return np.isin(positions, self.lookup(data))
+
+
+# ----------------- PLANNER -----------------
+def execute(data: Dataset, predicates: list[Predicate]) -> tuple[np.ndarray, list[dict]]:
+    """Sorted positions of the rows matching every predicate, plus the plan
+    that produced them (one step per predicate, in execution order)."""
+    steps = []
+
+    def step(pred, access, estimate, candidates, t0):
+        steps.append({"predicate": str(pred), "access": access, "estimate": estimate,
+                      "rows": len(candidates), "ms": round((time.perf_counter() - t0) * 1e3, 3)})
+
+    estimates = [(pred, pred.estimate(data)) for pred in predicates]
+    indexed = sorted(((p, e) for p, e in estimates if e is not None), key=lambda pe: pe[1])
+    residual = sorted((p for p, e in estimates if e is None), key=lambda p: p.weight)
+
+    t0 = time.perf_counter()
+    if indexed:
+        first, est = indexed.pop(0)
+        candidates = first.lookup(data)
+        step(first, "index", est, candidates, t0)
+    else:
+        candidates = np.arange(len(data), dtype=np.int64)
+        steps.append({"predicate": "all rows", "access": "scan", "estimate": len(data),
+                      "rows": len(data), "ms": 0.0})
+
+    # Each remaining predicate, most selective first: intersecting costs its
+    # lookup plus a merge, checking costs a per-row test of every candidate
+    for pred, est in indexed + [(p, None) for p in residual]:
+        t0 = time.perf_counter()
+        if not len(candidates):
+            candidates = EMPTY
+            step(pred, "skipped", est, candidates, t0)
+            continue
+        if est is not None and est + len(candidates) < pred.weight * len(candidates):
+            candidates = np.intersect1d(candidates, pred.lookup(data), assume_unique=True)
+            step(pred, "intersect", est, candidates, t0)
+        else:
+            candidates = candidates[pred.check(data, candidates)]
+            step(pred, "filter", est, candidates, t0)
+    return candidates, steps
@@ -0,0 +1,134 @@
+# rollups.py
+"""Precomputed totals behind the aggregation endpoints.
+
+Rows are summed once per dataset load into small frames of cells:
+
+    day              (account, day)                 -> measures
+    counterparty     (account, month, counterparty) -> measures
+
+where the measures are the row count, the number of debits and credits and
+their totals in cents. Weeks and months are summed from the day cells at
+query time, so a dashboard reads a few hundred cells, never the rows. When
+the store only grew, the new rows' cells are added to the previous load's.
+
+ID prefixes can have as many groups as there are rows, so they aren't
+rolled up ahead: the first query for a prefix length sums runs of the ID
+index's sorted order in one vectorised pass, and the table is kept.
+"""
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+MAX_ID_PREFIX = 32
+MEASURES = ["rows", "debits", "credits", "debit_cents", "credit_cents"]
+TIME_UNITS = ("day", "week", "month")
+
+# Leading words without digits: 'POS PURCHASE 2005... REF 140' -> 'POS PURCHASE'
+COUNTERPARTY_RX = re.compile(r"\s*(?:[^\d\s]+(?:\s+|$))*")
+
+
+def counterparties(descriptions) -> np.ndarray:
+    values = pd.Series(descriptions, dtype=object).fillna("").to_numpy(dtype=object)
+    return np.array([COUNTERPARTY_RX.match(d).group().strip() for d in values], dtype=object)
+
+
+def _week_start(days: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday; weeks start on Monday
+    return days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+
+
+def _sum(measures: pd.DataFrame, keys: list, names: list[str]) -> pd.DataFrame:
+    table = measures.groupby(keys, dropna=False, sort=True).sum()
+    table.index.names = names
+    return table
+
+
+class Rollups:
+    """The rollup tables of one Dataset (see the module docstring)."""
+
+    def __init__(self, df: pd.DataFrame, missing: int):
+        self.missing = missing  # cents value of a blank amount
+        self.tables = self._build(df)
+        self._id_tables = {}  # prefix length -> table, filled by by_id()
+
+    def _measures(self, df: pd.DataFrame) -> pd.DataFrame:
+        measures = {"rows": np.ones(len(df), dtype=np.int64)}
+        for col, count in (("debit", "debits"), ("credit", "credits")):
+            cents = df[f"{col}_cents"].to_numpy()
+            moved = (cents != self.missing) & (cents != 0)
+            measures[count] = moved.astype(np.int64)
+            measures[f"{col}_cents"] = np.where(moved, np.abs(cents), 0)
+        return pd.DataFrame(measures)[MEASURES]
+
+    def _build(self, df: pd.DataFrame) -> dict[str, pd.DataFrame]:
+        account = df["account"].fillna("").to_numpy(dtype=object) if "account" in df \
+            else np.full(len(df), "", dtype=object)
+        days = df["date_dt"].to_numpy().astype("datetime64[D]")
+        measures = self._measures(df)
+        dated = ~np.isnat(days)
+        return {
+            "day": _sum(measures[dated], [account[dated], days[dated]], ["account", "day"]),
+            "counterparty": _sum(measures, [account, days.astype("datetime64[M]"),
+                                            counterparties(df["description"])], ["account", "month", "key"]),
+        }
+
+    def extended(self, df: pd.DataFrame) -> "Rollups":
+        """These rollups plus the rows of ``df``, without re-reading old rows."""
+        merged = Rollups.__new__(Rollups)
+        merged.missing, merged._id_tables = self.missing, {}
+        new = self._build(df)
+        merged.tables = {
+            name: pd.concat([table, new[name]]).groupby(level=list(range(table.index.nlevels)),
+                                                         dropna=False, sort=True).sum()
+            for name, table in self.tables.items()
+        }
+        return merged
+
+    @property
+    def accounts(self) -> list[str]:
+        return sorted(self.tables["day"].index.get_level_values("account").unique().tolist())
+
+    def by_time(self, unit: str, account: Optional[str] = None, lo=None, hi=None) -> pd.DataFrame:
+        """Measures per day, week (starting Monday) or month, for days in [lo, hi]."""
+        if unit not in TIME_UNITS:
+            raise ValueError(f"unit must be one of {TIME_UNITS}")
+        cells = self.tables["day"]
+        if account is not None:
+            cells = cells[cells.index.get_level_values("account") == account]
+        days = cells.index.get_level_values("day").to_numpy().astype("datetime64[D]")
+        keep = np.ones(len(days), dtype=bool)
+        if lo is not None:
+            keep &= days >= np.datetime64(lo, "D")
+        if hi is not None:
+            keep &= days <= np.datetime64(hi, "D")
+        cells, days = cells[keep], days[keep]
+        if unit == "week":
+            keys = np.datetime_as_string(_week_start(days), unit="D")
+        else:
+            keys = np.datetime_as_string(days, unit="M" if unit == "month" else "D")
+        return cells.groupby(keys, sort=True).sum()  # ISO strings sort by date
+
+    def by_counterparty(self, account: Optional[str] = None, month=None) -> pd.DataFrame:
+        """Measures per counterparty, over all time or one month."""
+        cells = self.tables["counterparty"]
+        keep = np.ones(len(cells), dtype=bool)
+        if account is not None:
+            keep &= cells.index.get_level_values("account") == account
+        if month is not None:
+            keep &= cells.index.get_level_values("month") == np.datetime64(month, "M")
+        cells = cells[keep]
+        return cells.groupby(level="key", sort=True).sum()
+
+    def by_id(self, df: pd.DataFrame, ids, length: int) -> pd.DataFrame:
+        """Measures per ``length``-character ID prefix, over all time. ``ids``
+        is the IdIndex of ``df`` (rows without an ID are left out)."""
+        if not 1 <= length <= MAX_ID_PREFIX:
+            raise ValueError(f"ID prefix length must be between 1 and {MAX_ID_PREFIX}")
+        table = self._id_tables.get(length)
+        if table is None:
+            keys, sums = ids.prefix_totals(length, self._measures(df).to_numpy())
+            table = pd.DataFrame(sums, index=pd.Index(keys, name="key"), columns=MEASURES)
+            self._id_tables[length] = table
+        return table
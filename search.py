@@ -1,35 +1,111 @@
-import pdfplumber
-import re
-import pandas as pd
-
-def parse_pdf_to_csv(pdf_file="STMT.ENT.BOOK1.pdf", csv_file="transactions.csv"):
-    transactions = []
-    with pdfplumber.open(pdf_file) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-            for line in text.split("\n"):
-                match = re.match(
-                    r"(\d{2} \w{3} \d{2})\s+(.+?)\s+(\d+)?\s*(\d{2} \w{3} \d{2})?\s+(-?\d+[,\d]*\.\d{2}|0\.00)\s+(-?\d+[,\d]*\.\d{2}|0\.00)\s+([\d,]+\.\d{2})",
-                    line
-                )
-                if match:
-                    transactions.append({
-                        "date": match.group(1),
-                        "description": match.group(2).strip(),
-                        "id": match.group(3),
-                        "value_date": match.group(4),
-                        "debit": match.group(5),
-                        "credit": match.group(6),
-                        "balance": match.group(7),
-                    })
-    # Save to CSV
-    df = pd.DataFrame(transactions)
-    df.to_csv(csv_file, index=False)
-    return csv_file
-
-if __name__ == "__main__":
-    print("Parsing PDF to CSV...")
-    parse_pdf_to_csv()
-    print("CSV created: transactions.csv")
+# search.py
+"""Search filters shared by the HTML pages and the JSON API.
+
+Each filter maps user input to sorted int64 row positions in a Dataset and
+raises ValueError on input it can't parse.
+"""
+import functools
+from typing import Optional
+
+import numpy as np
+
+from cache import ResultCache, query_key
+from dataset import Dataset, parse_amount, parse_date
+from indexes import query_groups
+
+MAX_EDITS = 2  # fuzzy ID matching beyond this matches nearly anything
+
+# Matching positions of recent queries, per dataset generation
+POSITIONS = ResultCache()
+
+
+def cached(fn):
+    """Serve repeated (normalised) queries from POSITIONS. The cached arrays
+    are shared between requests, so they're returned read-only. Views (e.g.
+    a slice of a TextIndex postings list) are copied first: a view would keep
+    its whole base array alive while being charged only for its own bytes."""
+    @functools.wraps(fn)
+    def lookup(data: Dataset, *args, **kwargs) -> np.ndarray:
+        key = query_key(fn.__name__, *args, *sorted(kwargs.items()))
+        positions = POSITIONS.get(key, data.generation)
+        if positions is None:
+            positions = fn(data, *args, **kwargs)
+            if positions.base is not None:
+                positions = positions.copy()
+            positions.setflags(write=False)
+            POSITIONS.put(key, data.generation, positions, positions.nbytes)
+        return positions
+    return lookup
+
+
+@cached
+def by_date(data: Dataset, date: str = "", lo: Optional[str] = None, hi: Optional[str] = None) -> np.ndarray:
+    """A from/to range if either bound is given, else a partial date match."""
+    if lo or hi:
+        return data.dates.between(parse_date(lo) if lo else None, parse_date(hi) if hi else None)
+    return data.dates.matching(date.strip())
+
+
+@cached
+def by_amount(data: Dataset, amount: str = "", lo: Optional[str] = None, hi: Optional[str] = None,
+              tolerance: Optional[str] = None) -> np.ndarray:
+    """Debit/credit by value: a min/max range, amount ± tolerance, or exact."""
+    if lo or hi:
+        return data.amounts.between(abs(parse_amount(lo)) if lo else None,
+                                    abs(parse_amount(hi)) if hi else None)
+    if tolerance:
+        return data.amounts.near(parse_amount(amount), parse_amount(tolerance))
+    return data.amounts.exact(parse_amount(amount))
+
+
+@cached
+def by_amount_text(data: Dataset, amount: str) -> np.ndarray:
+    """Old behaviour: substring match on the printed amounts."""
+    amount = amount.replace(",", "").strip()
+    df = data.df
+    hits = (df["debit"].str.contains(amount, na=False, regex=False) |
+            df["credit"].str.contains(amount, na=False, regex=False))
+    return np.flatnonzero(hits.to_numpy())
+
+
+@cached
+def by_id(data: Dataset, id: str, edits: int = 0) -> np.ndarray:
+    """Exact ID, else ID prefix, else IDs containing it; failing all that
+    and with ``edits`` > 0, IDs within that many typos."""
+    if not 0 <= edits <= MAX_EDITS:
+        raise ValueError(f"edits must be between 0 and {MAX_EDITS}")
+    id = id.strip()
+    positions = data.ids.search(id)
+    if not len(positions):
+        positions = data.ids.contains(id)
+    if not len(positions) and edits > 0:
+        positions = data.ids.similar(id, edits)
+    return positions
+
+
+@cached
+def by_description(data: Dataset, q: str, prefix: bool = False, mode: str = "words") -> np.ndarray:
+    """Token search: words are AND-ed, 'OR' separates alternatives, 'word*'
+    matches a prefix (every word, with ``prefix=True``). ``mode="substring"``
+    matches ``q`` as plain text anywhere instead."""
+    if mode == "substring":
+        return by_description_text(data, q)
+    if mode != "words":
+        raise ValueError("mode must be 'words' or 'substring'")
+    groups = query_groups(q, prefix)
+    if not groups:
+        raise ValueError(f"no searchable words in {q!r}")
+    return data.text.match(groups)
+
+
+def by_description_text(data: Dataset, text: str) -> np.ndarray:
+    """Case-insensitive substring of the description, anywhere in it."""
+    text = text.strip()
+    if not text:
+        raise ValueError("empty search text")
+    descriptions = data.df["description"]
+    candidates = data.text.candidates(text, len(descriptions))
+    if candidates is None:  # nothing selective to narrow by: scan every row
+        candidates = np.arange(len(descriptions), dtype=np.int64)
+    hits = descriptions.iloc[candidates].str.contains(text, case=False, regex=False, na=False)
+    return candidates[hits.to_numpy()]
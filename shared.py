@@ -0,0 +1,119 @@
+# shared.py
+"""Serving one dataset from several worker processes.
+
+The first worker to load a version of the store builds its indexes and
+saves them under ``<store>/indexes/<version>/``: the large arrays as .npy
+files, everything else in one pickle. The other workers memory-map those
+files instead of building their own, so the OS keeps one copy in the page
+cache however many workers there are. An exclusive lock on the store makes
+them wait for that build rather than repeat it, and serialises writes to
+the store (ingesting statements, at startup or from the watcher).
+"""
+import os
+import pickle
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+import numpy as np
+
+try:  # POSIX only; without it every worker builds its own indexes
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INDEX_DIR = "indexes"
+LOCK_FILE = ".lock"
+STATE_FILE = "state.pkl"
+KEEP_VERSIONS = 2  # older index sets are deleted once a newer one is saved
+MIN_SHARED_BYTES = 64 * 1024  # smaller arrays just go in the pickle
+
+
+# Stores whose lock this thread holds
+_held = threading.local()
+
+
+@contextmanager
+def store_lock(path: str):
+    """Exclusive, cross-process lock on the store at ``path``. A thread that
+    already holds it may take it again (a second flock would wait forever)."""
+    os.makedirs(path, exist_ok=True)
+    key = os.path.realpath(path)
+    held = _held.__dict__.setdefault("paths", set())
+    if key in held:
+        yield
+        return
+    with open(os.path.join(path, LOCK_FILE), "ab") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        held.add(key)
+        try:
+            yield
+        finally:
+            held.discard(key)
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _index_dir(path: str, version: str) -> str:
+    return os.path.join(path, INDEX_DIR, version)
+
+
+class _Saver(pickle.Pickler):
+    def __init__(self, file, folder: str):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.folder, self.count = folder, 0
+
+    def persistent_id(self, obj):
+        if type(obj) is not np.ndarray or obj.dtype.hasobject or obj.nbytes < MIN_SHARED_BYTES:
+            return None
+        name = f"{self.count}.npy"
+        self.count += 1
+        np.save(os.path.join(self.folder, name), obj)
+        return name
+
+
+class _Loader(pickle.Unpickler):
+    def __init__(self, file, folder: str):
+        super().__init__(file)
+        self.folder = folder
+
+    def persistent_load(self, name):
+        # asarray: a plain read-only ndarray view of the mapping, not np.memmap
+        return np.asarray(np.load(os.path.join(self.folder, name), mmap_mode="r"))
+
+
+def publish(path: str, version: str, indexes: dict) -> None:
+    """Save ``indexes`` for the other workers. Call with store_lock held."""
+    final = _index_dir(path, version)
+    tmp = f"{final}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with open(os.path.join(tmp, STATE_FILE), "wb") as f:
+        _Saver(f, tmp).dump(indexes)
+    if os.path.isdir(final):  # saved by older code that built other indexes
+        shutil.rmtree(final)
+    os.rename(tmp, final)  # readers only ever see a complete set
+
+    # Workers still mapping a deleted set keep their pages until they reload
+    root = os.path.join(path, INDEX_DIR)
+    sets = sorted((e for e in os.scandir(root) if e.is_dir()), key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in sets[KEEP_VERSIONS:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def attach(path: str, version: str, rows: int, names: Iterable[str]) -> Optional[dict]:
+    """Indexes another worker saved for ``version``, memory-mapped; None if
+    there are none, or they don't cover ``rows`` rows and every index in
+    ``names``."""
+    folder = _index_dir(path, version)
+    try:
+        with open(os.path.join(folder, STATE_FILE), "rb") as f:
+            indexes = _Loader(f, folder).load()
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+        return None  # saved by code with other index classes: rebuild
+    complete = indexes.get("rows") == rows and all(name in indexes for name in names)
+    return indexes if complete else None